@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Set
+
+from metrics import CACHE_REFRESHES, CACHE_REQUESTS
+from upstream import CircuitOpenError, SingleFlight, UpstreamClient
+
+logger = logging.getLogger(__name__)
+
+# Per request: files served although they could not be revalidated upstream.
+# Set to a fresh set by whoever wants to know (see StaleWarningMiddleware).
+stale_files: ContextVar[Optional[Set[str]]] = ContextVar("stale_files", default=None)
+
+
+def _refresh_key(filename: str) -> str:
+    return f"refresh:{filename}"
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    etag: Optional[str]
+    digest: str
+    size: int
+    fetched_at: float
+    version: int = 1
+    kind: str = "json"
+
+
+class UpstreamCache:
+    """TTL cache for upstream files with ETag revalidation and stale-while-revalidate
+
+    Fresh entries are served directly. Expired entries are still served while a
+    single background request revalidates them with If-None-Match. Only a cold
+    miss waits for the network. The total size is bounded and the least
+    recently used files are evicted first.
+
+    on_update is called with (filename, entry, raw bytes) whenever a new
+    version of a file was stored; it must not block. In offline mode the network is never used
+    and only entries seeded from a snapshot are served.
+
+    When upstream fails, expired entries keep being served and are reported
+    in stale_files. A cold miss that fails asks fallback(filename) (blocking,
+    run in a thread) for the last known good entry, e.g. from a snapshot.
+    """
+
+    def __init__(
+        self,
+        client: UpstreamClient,
+        default_ttl: float = 300.0,
+        ttls: Optional[Dict[str, float]] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+        on_update: Optional[Callable[[str, CacheEntry, bytes], None]] = None,
+        offline: bool = False,
+        fallback: Optional[Callable[[str], Optional[CacheEntry]]] = None,
+    ):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.on_update = on_update
+        self.offline = offline
+        self.fallback = fallback
+        self.flights = SingleFlight()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._size = 0
+        # Files whose last load from upstream failed
+        self._failing: Set[str] = set()
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def ttl_for(self, filename: str) -> float:
+        return self.ttls.get(filename, self.default_ttl)
+
+    def peek(self, filename: str) -> Optional[CacheEntry]:
+        """Return the cached entry without touching LRU order or the network"""
+        return self._entries.get(filename)
+
+    def is_fresh(self, entry: CacheEntry, filename: str) -> bool:
+        return self.clock() - entry.fetched_at < self.ttl_for(filename)
+
+    def is_degraded(self, filename: str) -> bool:
+        """Whether the file cannot currently be revalidated upstream"""
+        breaker = getattr(self.client, "breaker", None)
+        return filename in self._failing or (breaker is not None and breaker.state == breaker.OPEN)
+
+    async def get_entry(self, filename: str, kind: str = "json") -> CacheEntry:
+        entry = self._entries.get(filename)
+        if entry is None:
+            CACHE_REQUESTS.inc(file=filename, result="miss")
+            if self.offline:
+                raise LookupError(f"{filename} is not available in offline mode")
+            entry = await self.flights.do(filename, lambda: self._load_or_fallback(filename, kind))
+            if filename in self._failing:
+                self._mark_stale(filename)
+            return entry
+
+        self._entries.move_to_end(filename)
+        if not self.offline and not self.is_fresh(entry, filename):
+            CACHE_REQUESTS.inc(file=filename, result="stale")
+            if self.is_degraded(filename):
+                self._mark_stale(filename)
+            # Own key: a cold miss after eviction must not join a refresh, which returns nothing
+            self.flights.start(_refresh_key(filename), lambda: self._refresh(filename, kind))
+        else:
+            CACHE_REQUESTS.inc(file=filename, result="hit")
+        return entry
+
+    def refreshing(self, filename: str) -> bool:
+        """Whether a background refresh of the file is running"""
+        return self.flights.in_flight(_refresh_key(filename))
+
+    @staticmethod
+    def _mark_stale(filename: str):
+        served = stale_files.get()
+        if served is not None:
+            served.add(filename)
+
+    async def get(self, filename: str, kind: str = "json") -> Any:
+        return (await self.get_entry(filename, kind)).value
+
+    async def refresh(self, filename: str, kind: str = "json") -> CacheEntry:
+        """Revalidate a file now, sharing any cold load or refresh() already running"""
+        if self.offline:
+            return await self.get_entry(filename, kind)
+        return await self.flights.do(filename, lambda: self._load(filename, kind))
+
+    async def _refresh(self, filename: str, kind: str):
+        try:
+            await self._load(filename, kind)
+        except CircuitOpenError:
+            pass  # Logged once when the circuit opened
+        except Exception as e:
+            logger.warning(f"Background refresh of {filename} failed, serving stale copy: {str(e)}")
+
+    async def _load_or_fallback(self, filename: str, kind: str) -> CacheEntry:
+        try:
+            return await self._load(filename, kind)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            entry = await asyncio.get_running_loop().run_in_executor(None, self.fallback, filename)
+            if entry is None:
+                raise
+            logger.warning(f"Loading {filename} failed, serving last known good copy: {str(e)}")
+            self.seed(filename, entry)
+            return entry
+
+    async def _load(self, filename: str, kind: str) -> CacheEntry:
+        entry = self._entries.get(filename)
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else None
+        try:
+            response = await self.client.get(filename, headers=headers)
+        except Exception:
+            CACHE_REFRESHES.inc(file=filename, result="failed")
+            self._failing.add(filename)
+            raise
+        self._failing.discard(filename)
+        now = self.clock()
+
+        if response.status_code == 304 and entry is not None:
+            CACHE_REFRESHES.inc(file=filename, result="not_modified")
+            entry.fetched_at = now
+            return entry
+
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        current = self._entries.get(filename)
+        if current is not None and current.digest == digest:
+            # Same bytes without ETag support upstream
+            CACHE_REFRESHES.inc(file=filename, result="unchanged")
+            current.etag = response.headers.get("etag")
+            current.fetched_at = now
+            return current
+
+        if kind == "json":
+            value = response.json()
+        elif kind == "bytes":
+            value = content
+        else:
+            value = response.text
+        new_entry = CacheEntry(
+            value=value,
+            etag=response.headers.get("etag"),
+            digest=digest,
+            size=len(content),
+            fetched_at=now,
+            version=current.version + 1 if current is not None else 1,
+            kind=kind,
+        )
+        CACHE_REFRESHES.inc(file=filename, result="updated")
+        self._store(filename, new_entry)
+        if self.on_update is not None:
+            try:
+                self.on_update(filename, new_entry, content)
+            except Exception as e:
+                logger.warning(f"Update hook for {filename} failed: {str(e)}")
+        return new_entry
+
+    def _store(self, filename: str, entry: CacheEntry):
+        old = self._entries.pop(filename, None)
+        if old is not None:
+            self._size -= old.size
+        self._entries[filename] = entry
+        self._size += entry.size
+        # The entry just stored is the most recent one and is always kept
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            evicted_name, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+            logger.info(f"Evicted {evicted_name} from upstream cache")
+
+    def seed(self, filename: str, entry: CacheEntry, stale: bool = True):
+        """Insert an entry from elsewhere (e.g. a snapshot); stale entries refresh on first use"""
+        if stale:
+            entry.fetched_at = float("-inf")
+        self._store(filename, entry)
+
+    def invalidate(self, filename: str):
+        entry = self._entries.pop(filename, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
@@ -0,0 +1,386 @@
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from upstream import SingleFlight, UpstreamClient
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIXES = ("image/", "audio/", "video/")
+
+# Requested widths are rounded up to one of these, so a handful of variants
+# per image covers every screen
+VARIANT_WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+JPEG_QUALITY = 80
+WEBP_QUALITY = 80
+
+_RANGE_RE = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$", re.IGNORECASE)
+
+
+def media_type_for(path: str) -> Optional[str]:
+    """The media type of an image, audio or video path, None for anything else"""
+    media_type, _ = mimetypes.guess_type(path)
+    if media_type is None or not media_type.startswith(MEDIA_PREFIXES):
+        return None
+    return media_type
+
+
+def is_safe_path(path: str) -> bool:
+    segments = path.split("/")
+    return bool(path) and not path.startswith("/") and all(s not in ("", ".", "..") for s in segments)
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single byte range, None to serve the whole file
+
+    Multiple ranges and malformed headers are ignored as RFC 9110 allows.
+    Raises ValueError for a well-formed range that cannot be satisfied.
+    """
+    match = _RANGE_RE.match(header)
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last n bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise ValueError("Range starts beyond the end of the file")
+    return start, min(end, size - 1)
+
+
+def variant_width(requested: int) -> int:
+    """Round a requested width up to the next variant width"""
+    for width in VARIANT_WIDTHS:
+        if width >= requested:
+            return width
+    return VARIANT_WIDTHS[-1]
+
+
+def resize_image(content: bytes, width: int, webp: bool = False) -> Optional[Tuple[bytes, str]]:
+    """Downscale an image to width and re-encode it; returns (bytes, media type)
+
+    Returns None when the original is already at most that wide, cannot be
+    decoded, or the re-encoded variant would not be smaller.
+    """
+    try:
+        # Imported on first use to keep it out of startup time
+        from PIL import Image, ImageOps
+    except ImportError:  # Pillow is optional, without it originals are served unresized
+        return None
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            if image.width <= width or getattr(image, "is_animated", False):
+                return None
+            source_format = image.format
+            image = ImageOps.exif_transpose(image)
+            height = max(1, round(image.height * width / image.width))
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+            image = image.convert("RGBA" if has_alpha else "RGB").resize((width, height), Image.LANCZOS)
+
+            output = io.BytesIO()
+            if webp:
+                image.save(output, "WEBP", quality=WEBP_QUALITY, method=4)
+                media_type = "image/webp"
+            elif has_alpha or source_format == "PNG":
+                image.save(output, "PNG", optimize=True)
+                media_type = "image/png"
+            else:
+                image.save(output, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+                media_type = "image/jpeg"
+    except Exception as e:
+        logger.warning(f"Could not resize image: {str(e)}")
+        return None
+
+    data = output.getvalue()
+    if len(data) >= len(content):
+        return None
+    return data, media_type
+
+
+@dataclass
+class MediaEntry:
+    key: str
+    digest: str
+    size: int
+    media_type: str
+    # Upstream ETag, originals only
+    etag: Optional[str] = None
+    # Wall clock time, so freshness survives restarts
+    fetched_at: float = 0.0
+
+    @property
+    def response_etag(self) -> str:
+        return f'"{self.digest[:32]}"'
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class MediaCache:
+    """Content-addressed media files on disk with a size limit and LRU eviction
+
+    Each distinct file is stored once under objects/ by its SHA-256; refs/
+    maps keys (upstream paths and image variants) to digests. The least
+    recently used refs are dropped first and a blob is deleted with its last
+    ref. Ref modification times keep the LRU order across restarts.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, MediaEntry]" = OrderedDict()
+        self._blobs: Dict[str, int] = {}
+        self._size = 0
+        self._load()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def blob_path(self, digest: str) -> Path:
+        return self.directory / "objects" / digest[:2] / digest
+
+    def _ref_path(self, key: str) -> Path:
+        return self.directory / "refs" / (hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self):
+        refs = self.directory / "refs"
+        if not refs.is_dir():
+            return
+        for path in sorted(refs.glob("*.json"), key=lambda p: p.stat().st_mtime):
+            try:
+                entry = MediaEntry(**json.loads(path.read_text("utf-8")))
+                if not self.blob_path(entry.digest).is_file():
+                    path.unlink()
+                    continue
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable media ref {path.name}: {str(e)}")
+                continue
+            self._add(entry)
+        with self._lock:
+            self._evict()
+
+    def _add(self, entry: MediaEntry):
+        self._entries[entry.key] = entry
+        if entry.digest not in self._blobs:
+            self._size += entry.size
+        self._blobs[entry.digest] = self._blobs.get(entry.digest, 0) + 1
+
+    def _release(self, entry: MediaEntry):
+        count = self._blobs.get(entry.digest, 0) - 1
+        if count > 0:
+            self._blobs[entry.digest] = count
+            return
+        self._blobs.pop(entry.digest, None)
+        self._size -= entry.size
+        self.blob_path(entry.digest).unlink(missing_ok=True)
+
+    def _evict(self):
+        # The most recent entry is always kept, even if it alone exceeds the limit
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            self._ref_path(key).unlink(missing_ok=True)
+            self._release(entry)
+            logger.info(f"Evicted {key} from media cache")
+
+    def get(self, key: str) -> Optional[MediaEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not self.blob_path(entry.digest).is_file():
+                # Evicted by another worker process sharing the directory
+                del self._entries[key]
+                self._release(entry)
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(self._ref_path(key))
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, content: bytes, media_type: str, etag: Optional[str] = None) -> MediaEntry:
+        digest = hashlib.sha256(content).hexdigest()
+        entry = MediaEntry(key, digest, len(content), media_type, etag, time.time())
+        with self._lock:
+            blob = self.blob_path(digest)
+            if not blob.is_file():
+                _write_atomic(blob, content)
+            self._put_ref(entry)
+        return entry
+
+    def link(self, key: str, target: MediaEntry) -> MediaEntry:
+        """Store key as another ref to the blob of target, without copying it"""
+        entry = MediaEntry(key, target.digest, target.size, target.media_type, None, time.time())
+        with self._lock:
+            if not self.blob_path(target.digest).is_file():
+                return target
+            self._put_ref(entry)
+        return entry
+
+    def _put_ref(self, entry: MediaEntry):
+        _write_atomic(self._ref_path(entry.key), json.dumps(asdict(entry)).encode("utf-8"))
+        old = self._entries.pop(entry.key, None)
+        self._add(entry)
+        if old is not None:
+            self._release(old)
+        self._evict()
+
+    def touch(self, entry: MediaEntry, etag: Optional[str] = None):
+        """Mark an entry as revalidated"""
+        with self._lock:
+            entry.fetched_at = time.time()
+            if etag:
+                entry.etag = etag
+            if self._entries.get(entry.key) is entry:
+                _write_atomic(self._ref_path(entry.key), json.dumps(asdict(entry)).encode("utf-8"))
+
+    def read(self, entry: MediaEntry, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Bytes start..end (inclusive) of an entry's blob"""
+        with open(self.blob_path(entry.digest), "rb") as f:
+            f.seek(start)
+            return f.read((entry.size if end is None else end + 1) - start)
+
+
+class MediaProxy:
+    """Upstream media through the disk cache, with on-demand image variants
+
+    Originals are fresh for ttl seconds; after that they are still served
+    while a background request revalidates them with If-None-Match. Variants
+    are keyed by the digest of their original, so they never outlive it.
+    """
+
+    def __init__(self, client: UpstreamClient, cache: MediaCache, ttl: float = 86400.0, offline: bool = False):
+        self.client = client
+        self.cache = cache
+        self.ttl = ttl
+        self.offline = offline
+        self.flights = SingleFlight()
+
+    async def original(self, path: str) -> MediaEntry:
+        """The cached original; raises LookupError if upstream does not have it"""
+        entry = await run_in_threadpool(self.cache.get, path)
+        if entry is None:
+            if self.offline:
+                raise LookupError(f"{path} is not available in offline mode")
+            return await self.flights.do(path, lambda: self._fetch(path))
+        if not self.offline and time.time() - entry.fetched_at >= self.ttl:
+            # Own key: a cold miss after eviction must not join a refresh, which returns nothing
+            self.flights.start(f"refresh:{path}", lambda: self._refresh(path))
+        return entry
+
+    async def _refresh(self, path: str):
+        try:
+            await self._fetch(path)
+        except Exception as e:
+            logger.warning(f"Background refresh of media {path} failed, serving stale copy: {str(e)}")
+
+    async def _fetch(self, path: str) -> MediaEntry:
+        entry = await run_in_threadpool(self.cache.get, path)
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else None
+        try:
+            response = await self.client.get(path, headers=headers, label="media")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                raise LookupError(f"{path} does not exist upstream")
+            raise
+        if response.status_code == 304 and entry is not None:
+            await run_in_threadpool(self.cache.touch, entry, response.headers.get("etag"))
+            return entry
+        return await run_in_threadpool(
+            self.cache.put, path, response.content, media_type_for(path) or "application/octet-stream",
+            response.headers.get("etag"),
+        )
+
+    async def variant(self, original: MediaEntry, width: int, webp: bool = False) -> MediaEntry:
+        """A resized variant of an image, or the original if resizing does not help"""
+        width = variant_width(width)
+        key = f"{original.key}@{original.digest[:16]}?w={width}" + ("&webp" if webp else "")
+        entry = await run_in_threadpool(self.cache.get, key)
+        if entry is not None:
+            return entry
+
+        def build() -> MediaEntry:
+            resized = resize_image(self.cache.read(original), width, webp)
+            if resized is None:
+                # Remembered as the original, so it is not decoded again on every request
+                return self.cache.link(key, original)
+            data, media_type = resized
+            return self.cache.put(key, data, media_type)
+
+        return await self.flights.do(key, lambda: run_in_threadpool(build))
+
+
+async def media_response(
+    request: Request, cache: MediaCache, entry: MediaEntry, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Serve a cached file with ETag revalidation and single byte ranges"""
+    response_headers = {"ETag": entry.response_etag, "Accept-Ranges": "bytes"}
+    if headers:
+        response_headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and entry.response_etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=response_headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == entry.response_etag):
+        try:
+            byte_range = parse_range(range_header, entry.size)
+        except ValueError:
+            response_headers["Content-Range"] = f"bytes */{entry.size}"
+            return Response(status_code=416, headers=response_headers)
+        if byte_range is not None:
+            start, end = byte_range
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+            return Response(
+                content=await run_in_threadpool(cache.read, entry, start, end),
+                status_code=206,
+                media_type=entry.media_type,
+                headers=response_headers,
+            )
+
+    return FileResponse(cache.blob_path(entry.digest), media_type=entry.media_type, headers=response_headers)
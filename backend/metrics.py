@@ -0,0 +1,270 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request header that turns on the Server-Timing breakdown for one request
+PROFILE_HEADER = "x-profile"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["Metric"] = []
+
+    def register(self, metric: "Metric"):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    """Base for metrics with a fixed set of label names, updated with label keyword arguments"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{self._labels(key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: per-bucket (non-cumulative) counts, sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        counts, _ = self._values.get(self._key(labels), ([0], [0.0]))
+        return sum(counts)
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket{self._labels(key, ('le', _format_value(bound)))} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {_format_value(total[0])}"
+            yield f"{self.name}_count{self._labels(key)} {cumulative}"
+
+
+REQUEST_DURATION = Histogram(
+    "alltagslabor_request_duration_seconds", "Time to answer an API request", ("method", "route", "status"),
+)
+CACHE_REQUESTS = Counter(
+    "alltagslabor_cache_requests_total", "Upstream cache lookups by result (hit, stale, miss)", ("file", "result"),
+)
+CACHE_REFRESHES = Counter(
+    "alltagslabor_cache_refreshes_total",
+    "Upstream cache loads by outcome (updated, unchanged, not_modified, failed)",
+    ("file", "result"),
+)
+CACHE_BYTES = Gauge("alltagslabor_cache_bytes", "Bytes held by the upstream cache")
+UPSTREAM_DURATION = Histogram(
+    "alltagslabor_upstream_request_duration_seconds", "Time of requests to GitLab", ("file", "status"),
+)
+UPSTREAM_CIRCUIT = Gauge(
+    "alltagslabor_upstream_circuit_state", "Circuit breaker state for GitLab (0 closed, 1 half-open, 2 open)",
+)
+UPSTREAM_BYTES = Counter("alltagslabor_upstream_bytes_total", "Response bytes received from GitLab", ("file",))
+INDEX_BUILD_DURATION = Histogram(
+    "alltagslabor_index_build_seconds", "Time to validate and index a dataset", ("dataset",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+DATASET_EXPERIMENTS = Gauge("alltagslabor_dataset_experiments", "Experiments in the loaded dataset", ("dataset",))
+DATASET_BYTES = Gauge("alltagslabor_dataset_bytes", "Size of the loaded dataset file", ("dataset",))
+SEARCH_RESULTS = Histogram(
+    "alltagslabor_search_results", "Experiments returned per search request", ("kind",),
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timing", default=None)
+# perf_counter() when the endpoint function returned, to time response validation
+_ENDPOINT_DONE = "_endpoint_done"
+
+
+@contextmanager
+def stage(name: str):
+    """Add the time spent in the block to the Server-Timing breakdown, if one is being collected"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{name};dur={duration * 1000:.2f}" for name, duration in timings.items() if not name.startswith("_")]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that labels requests with the route template and marks when the endpoint returned"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        @wraps(endpoint)
+        async def timed_endpoint(*args, **kw):
+            try:
+                return await endpoint(*args, **kw)
+            finally:
+                timings = _timings.get()
+                if timings is not None:
+                    timings[_ENDPOINT_DONE] = time.perf_counter()
+
+        super().__init__(path, timed_endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request):
+            request.scope["route_path"] = self.path
+            return await handler(request)
+
+        return route_handler
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that reports response_model validation and JSON encoding as separate stages"""
+
+    def render(self, content) -> bytes:
+        timings = _timings.get()
+        if timings is None:
+            return super().render(content)
+        started = time.perf_counter()
+        done = timings.pop(_ENDPOINT_DONE, None)
+        if done is not None:
+            timings["validate"] = timings.get("validate", 0.0) + started - done
+        body = super().render(content)
+        timings["serialize"] = timings.get("serialize", 0.0) + time.perf_counter() - started
+        return body
+
+
+class MetricsMiddleware:
+    """Records the latency of every request and adds Server-Timing when the profile header is set"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = {} if Headers(scope=scope).get(PROFILE_HEADER) else None
+        token = _timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", server_timing(timings, time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=scope.get("route_path", "other"),
+                status=str(status),
+            )
@@ -0,0 +1,41 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+# Define Models
+class ExperimentStep(BaseModel):
+    type: str
+    content: str
+    description: Optional[str] = ""
+
+class Experiment(BaseModel):
+    id: str = ""
+    title: str
+    shortDescription: str
+    subject: str
+    gradeLevel: str
+    steps: List[ExperimentStep]
+    schoolType: str
+
+class SearchFilters(BaseModel):
+    subject: Optional[str] = None
+    gradeLevel: Optional[str] = None
+    schoolType: Optional[str] = None
+    freetext: Optional[str] = None
+
+class ExperimentIds(BaseModel):
+    ids: List[str] = Field(..., max_length=500)
+
+class ExperimentBatch(BaseModel):
+    experiments: List[Experiment]
+    missing: List[str]
+
+class TranslationRequest(BaseModel):
+    texts: List[str] = Field(..., max_length=5000)
+    target: str = Field(..., pattern=r"^[a-z]{2,3}(-[A-Za-z]{2,4})?$")
+    source: str = Field("auto", pattern=r"^(auto|[a-z]{2,3}(-[A-Za-z]{2,4})?)$")
+
+class TranslationResponse(BaseModel):
+    translations: List[str]
+    cached: int
+    translated: int
+    failed: int
@@ -0,0 +1,72 @@
+import base64
+import hashlib
+import json
+from bisect import bisect_right
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+
+class Cursor(NamedTuple):
+    digest: str
+    offset: int
+    after_id: Optional[str] = None
+    query: str = ""
+
+
+# Only a prefix of the dataset digest is needed to detect a version change
+_DIGEST_PREFIX = 12
+_QUERY_PREFIX = 12
+
+
+def query_hash(filters: Dict[str, Optional[str]], fields: Optional[List[str]]) -> str:
+    """Short hash of the filters and projection of a listing, to tie its cursors to it"""
+    query = {"filters": {name: value for name, value in filters.items() if value}, "fields": fields}
+    encoded = json.dumps(query, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:_QUERY_PREFIX]
+
+
+def encode_cursor(digest: str, offset: int, after_id: Optional[str] = None, query: str = "") -> str:
+    payload = {"d": digest[:_DIGEST_PREFIX], "o": offset, "q": query}
+    if after_id is not None:
+        payload["a"] = after_id
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Decode an opaque cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        offset = int(payload["o"])
+        digest = str(payload["d"])
+        after_id = payload.get("a")
+        query = str(payload.get("q", ""))
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return Cursor(digest, offset, str(after_id) if after_id is not None else None, query)
+
+
+def resume_offset(
+    cursor: Cursor,
+    digest: str,
+    query: str,
+    positions: Optional[Callable[[], List[int]]],
+    after_position: Optional[int],
+) -> int:
+    """Offset to continue from, even if the dataset changed since the cursor was issued
+
+    query is the query_hash() of the listing, which must be the one the cursor
+    was issued for. positions returns the sorted result of a dataset-order
+    listing (None for ranked results) and after_position is the current
+    position of the cursor's last experiment. Ranked results cannot be resumed
+    across versions.
+    """
+    if cursor.query != query:
+        raise ValueError("Cursor belongs to a different query")
+    if digest[:_DIGEST_PREFIX] == cursor.digest:
+        return cursor.offset
+    if positions is None or after_position is None:
+        raise ValueError("Cursor expired, the dataset has changed")
+    return bisect_right(positions(), after_position)
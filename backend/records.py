@@ -0,0 +1,70 @@
+import json
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+from models import Experiment
+
+# Experiment fields in declaration order, which is the order of model_dump()
+FIELDS = tuple(Experiment.model_fields)
+
+# Steps are encoded last, so they are the tail of the encoded experiment
+_STEPS_KEY = b',"steps":'
+
+
+def encode_experiment(exp: Experiment) -> bytes:
+    """Compact JSON of an experiment, encoded like the API responses, with steps last"""
+    content = {field: getattr(exp, field) for field in FIELDS if field != "steps"}
+    content["steps"] = [step.model_dump() for step in exp.steps]
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ExperimentRecord:
+    """Compact, read-only form of a validated Experiment
+
+    Subject, grade level and school type are interned, so each distinct
+    value is stored once. The experiment is kept encoded as the JSON that
+    the API sends, so full results are joined without decoding or validating
+    them again. Steps hold most of the bytes of an experiment but are only
+    needed by detail views, so they are decoded on access.
+    """
+
+    __slots__ = ("id", "title", "shortDescription", "subject", "gradeLevel", "schoolType", "encoded")
+
+    def __init__(
+        self,
+        id: str,
+        title: str,
+        shortDescription: str,
+        subject: str,
+        gradeLevel: str,
+        schoolType: str,
+        encoded: bytes,
+    ):
+        self.id = id
+        self.title = title
+        self.shortDescription = shortDescription
+        self.subject = sys.intern(subject)
+        self.gradeLevel = sys.intern(gradeLevel)
+        self.schoolType = sys.intern(schoolType)
+        self.encoded = encoded
+
+    @classmethod
+    def from_model(cls, exp: Experiment) -> "ExperimentRecord":
+        return cls(
+            exp.id, exp.title, exp.shortDescription, exp.subject, exp.gradeLevel, exp.schoolType,
+            encode_experiment(exp),
+        )
+
+    @property
+    def encoded_steps(self) -> bytes:
+        # Keys and strings before the steps are escaped, so the first match is the steps key
+        return self.encoded[self.encoded.index(_STEPS_KEY) + len(_STEPS_KEY):-1]
+
+    @property
+    def steps(self) -> List[Dict[str, Any]]:
+        return json.loads(self.encoded_steps)
+
+    def model_dump(self, include: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Like Experiment.model_dump(); steps are only decoded when included"""
+        fields = FIELDS if include is None else [field for field in FIELDS if field in include]
+        return {field: self.steps if field == "steps" else getattr(self, field) for field in fields}
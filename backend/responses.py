@@ -0,0 +1,231 @@
+import gzip
+import hashlib
+import json
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+from cache import stale_files
+from upstream import SingleFlight
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Streamed lines are sent in chunks of about this size
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Warning header for responses built from data that could not be revalidated
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+def dump_json(content: Any) -> bytes:
+    """Encode like FastAPI's JSONResponse does"""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class EncodedBody:
+    """A response body encoded once, with compressed variants and a strong ETag"""
+
+    __slots__ = ("identity", "gzip", "br", "etag_hash", "media_type")
+
+    def __init__(self, identity: bytes, media_type: str = "application/json"):
+        self.identity = identity
+        self.media_type = media_type
+        self.etag_hash = hashlib.sha256(identity).hexdigest()[:32]
+        self.gzip: Optional[bytes] = None
+        self.br: Optional[bytes] = None
+        if len(identity) >= MIN_COMPRESS_SIZE:
+            self.gzip = gzip.compress(identity, compresslevel=GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.br = brotli.compress(identity, quality=BROTLI_QUALITY)
+
+    @classmethod
+    def from_json(cls, content: Any) -> "EncodedBody":
+        return cls(dump_json(content))
+
+    def etag(self, encoding: str = "identity") -> str:
+        # Each encoding is a different representation and gets its own strong ETag
+        if encoding == "identity":
+            return f'"{self.etag_hash}"'
+        return f'"{self.etag_hash}-{encoding}"'
+
+    def variant(self, encoding: str) -> bytes:
+        if encoding == "br" and self.br is not None:
+            return self.br
+        if encoding == "gzip" and self.gzip is not None:
+            return self.gzip
+        return self.identity
+
+    def available(self) -> Tuple[str, ...]:
+        encodings = []
+        if self.br is not None:
+            encodings.append("br")
+        if self.gzip is not None:
+            encodings.append("gzip")
+        return tuple(encodings)
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q}"""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def choose_encoding(body: EncodedBody, accept_encoding: str) -> str:
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in body.available():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(body: EncodedBody, if_none_match: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag.split("-", 1)[0] == body.etag_hash:
+            return True
+    return False
+
+
+def wants_ndjson(request: Request) -> bool:
+    """Whether the client asked for newline-delimited JSON"""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_chunks(items: Iterable[Any], chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """Encode items lazily as one JSON document per line, batched into chunks"""
+    lines = []
+    size = 0
+    for item in items:
+        # Items may come encoded already
+        line = (item if isinstance(item, bytes) else dump_json(item)) + b"\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield b"".join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield b"".join(lines)
+
+
+def encoded_response(request: Request, body: EncodedBody, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serve a pre-encoded body, answering If-None-Match with 304"""
+    encoding = choose_encoding(body, request.headers.get("accept-encoding", ""))
+    response_headers = {
+        "ETag": body.etag(encoding),
+        "Vary": "Accept-Encoding",
+    }
+    if headers:
+        response_headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(body, if_none_match):
+        return Response(status_code=304, headers=response_headers)
+
+    if encoding != "identity":
+        response_headers["Content-Encoding"] = encoding
+    return Response(content=body.variant(encoding), media_type=body.media_type, headers=response_headers)
+
+
+class ResponseCache:
+    """Encoded response bodies by key, kept for the latest source version only
+
+    Keys of bodies built from one dataset end with ":<dataset file>", so
+    they can be dropped together when that dataset's store is evicted.
+    """
+
+    def __init__(self):
+        self._bodies: Dict[str, Tuple[Hashable, EncodedBody]] = {}
+        self.flights = SingleFlight()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._bodies
+
+    async def get(self, key: str, version: Hashable, build: Callable[[], Any]) -> EncodedBody:
+        """Return the body for key at version, encoding build() off the event loop on a miss"""
+        cached = self._bodies.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        def encode_body() -> EncodedBody:
+            content = build()
+            # build() may return the encoded JSON itself
+            return EncodedBody(content) if isinstance(content, bytes) else EncodedBody.from_json(content)
+
+        async def encode():
+            body = await run_in_threadpool(encode_body)
+            self._bodies[key] = (version, body)
+            return body
+
+        return await self.flights.do(f"{key}@{version}", encode)
+
+    def discard_source(self, source: str):
+        """Drop all bodies built from the given dataset file"""
+        suffix = f":{source}"
+        for key in [key for key in self._bodies if key.endswith(suffix)]:
+            del self._bodies[key]
+
+    def clear(self):
+        self._bodies.clear()
+
+
+class StaleWarningMiddleware:
+    """Adds a Warning header to responses that used upstream data that could not be revalidated"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        served = set()
+        token = stale_files.set(served)
+
+        async def send_with_warning(message):
+            if message["type"] == "http.response.start" and served:
+                MutableHeaders(scope=message).append("Warning", STALE_WARNING)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_warning)
+        finally:
+            stale_files.reset(token)
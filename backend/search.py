@@ -0,0 +1,186 @@
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Umlauts and ß are folded the way they are written without a German keyboard
+_FOLD = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Inflectional endings, longest first; only one is removed per token
+_SUFFIXES = ("ern", "ers", "em", "en", "er", "es", "e", "s")
+_MIN_STEM = 4
+
+# Steps whose content is a file path rather than prose
+MEDIA_STEP_TYPES = {"image", "audio", "video"}
+
+# BM25 parameters and per-field weights
+K1 = 1.2
+FIELD_WEIGHTS = {"title": 3.0, "shortDescription": 2.0, "steps": 1.0}
+FIELD_B = {"title": 0.5, "shortDescription": 0.75, "steps": 0.75}
+
+# Prefix expansions ("Mech" -> "mechanik") count less than exact terms.
+# Shorter terms (the first keystrokes of a word) only rank, they do not filter.
+PREFIX_MIN_LENGTH = 3
+PREFIX_WEIGHT = 0.5
+PREFIX_MAX_EXPANSIONS = 32
+
+
+def fold(text: str) -> str:
+    """Lowercase, replace umlauts/ß and strip remaining accents"""
+    text = text.lower().translate(_FOLD)
+    if text.isascii():
+        return text
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """Light German stemmer: drop one common inflectional ending"""
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Fold and split a piece of text into words"""
+    return _TOKEN_RE.findall(fold(text))
+
+
+def analyze(text: str) -> List[str]:
+    """Fold, tokenize and stem a piece of text"""
+    return [stem(token) for token in tokenize(text)]
+
+
+class TextIndex:
+    """Inverted index with BM25F-style ranking over title, description and steps
+
+    Each posting stores the precomputed score contribution of a term for a
+    document, so a query only sums impacts over the postings of its terms.
+    """
+
+    def __init__(self, documents: Sequence[Dict[str, str]]):
+        self.size = len(documents)
+        field_tokens: List[Dict[str, List[str]]] = [
+            {field: analyze(doc.get(field, "")) for field in FIELD_WEIGHTS} for doc in documents
+        ]
+        avg_length = {}
+        for field in FIELD_WEIGHTS:
+            total = sum(len(tokens[field]) for tokens in field_tokens)
+            avg_length[field] = total / self.size if total else 1.0
+
+        # term -> {doc: weighted, length-normalized term frequency}
+        weighted_tf: Dict[str, Dict[int, float]] = {}
+        for doc_id, tokens in enumerate(field_tokens):
+            for field, weight in FIELD_WEIGHTS.items():
+                if not tokens[field]:
+                    continue
+                b = FIELD_B[field]
+                norm = (1 - b) + b * len(tokens[field]) / avg_length[field]
+                for term, tf in Counter(tokens[field]).items():
+                    postings = weighted_tf.setdefault(term, {})
+                    postings[doc_id] = postings.get(doc_id, 0.0) + weight * tf / norm
+
+        self.postings: Dict[str, Dict[int, float]] = {}
+        for term, postings in weighted_tf.items():
+            df = len(postings)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            self.postings[term] = {doc_id: idf * tf / (K1 + tf) for doc_id, tf in postings.items()}
+        self.vocabulary: List[str] = sorted(self.postings)
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """Vocabulary terms matching a query term, with their weight"""
+        matches = [(term, 1.0)] if term in self.postings else []
+        start = bisect_left(self.vocabulary, term)
+        for candidate in islice(self.vocabulary, start, start + PREFIX_MAX_EXPANSIONS + 1):
+            if not candidate.startswith(term):
+                break
+            if candidate != term:
+                matches.append((candidate, PREFIX_WEIGHT))
+        return matches
+
+    def scores(self, query: str, candidates: Optional[Set[int]] = None) -> Dict[int, float]:
+        """Score documents containing every query term (optionally within candidates)
+
+        Terms shorter than PREFIX_MIN_LENGTH are too short to expand; they
+        only rank documents containing them exactly. A query of nothing but
+        short terms matches all documents (or candidates), as a filter-only
+        listing would.
+        """
+        terms = list(dict.fromkeys(analyze(query)))
+        if not terms:
+            return {}
+        short = [term for term in terms if len(term) < PREFIX_MIN_LENGTH]
+        result = self._match_all([term for term in terms if len(term) >= PREFIX_MIN_LENGTH], candidates)
+        if result is None:
+            result = dict.fromkeys(range(self.size) if candidates is None else candidates, 0.0)
+        for term in short:
+            for doc_id, impact in self.postings.get(term, {}).items():
+                if doc_id in result:
+                    result[doc_id] += impact
+        return result
+
+    def _match_all(self, terms: List[str], candidates: Optional[Set[int]]) -> Optional[Dict[int, float]]:
+        # None when there are no terms, as opposed to no matches
+        result: Optional[Dict[int, float]] = None
+        # Rarest terms first keeps the intermediate result small
+        expanded = sorted(
+            (self._expand(term) for term in terms),
+            key=lambda matches: sum(len(self.postings[t]) for t, _ in matches),
+        )
+        for matches in expanded:
+            term_scores: Dict[int, float] = {}
+            for candidate, weight in matches:
+                for doc_id, impact in self.postings[candidate].items():
+                    if candidates is not None and doc_id not in candidates:
+                        continue
+                    if result is not None and doc_id not in result:
+                        continue
+                    score = impact * weight
+                    if score > term_scores.get(doc_id, 0.0):
+                        term_scores[doc_id] = score
+            if result is None:
+                result = term_scores
+            else:
+                result = {doc_id: result[doc_id] + score for doc_id, score in term_scores.items()}
+            if not result:
+                return {}
+        return result
+
+    def search(
+        self,
+        query: str,
+        candidates: Optional[Set[int]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Tuple[int, float]]:
+        """Ranked (doc, score) pairs, best first; ties keep dataset order"""
+        scored = self.scores(query, candidates)
+        key = lambda item: (-item[1], item[0])
+        if limit is None:
+            ranked = sorted(scored.items(), key=key)
+        else:
+            ranked = heapq.nsmallest(offset + limit, scored.items(), key=key)
+        return ranked[offset:]
+
+
+def experiment_document(title: str, short_description: str, steps: Iterable[Tuple[str, str, str]]) -> Dict[str, str]:
+    """Searchable fields of an experiment; steps are (type, content, description)"""
+    step_texts = []
+    for step_type, content, description in steps:
+        if step_type not in MEDIA_STEP_TYPES:
+            step_texts.append(content)
+        if description:
+            step_texts.append(description)
+    return {
+        "title": title,
+        "shortDescription": short_description,
+        "steps": "\n".join(step_texts),
+    }
@@ -1,156 +1,890 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+import asyncio
 import os
 import logging
-import requests
 from pathlib import Path
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
+import hashlib
 import json
+import math
 import re
+_framework_imported = time.perf_counter()
+
+from cache import CacheEntry, UpstreamCache
+from metrics import (
+    CACHE_BYTES,
+    CONTENT_TYPE,
+    REGISTRY,
+    SEARCH_RESULTS,
+    MetricsMiddleware,
+    TimedJSONResponse,
+    TimedRoute,
+    stage,
+)
+from models import (
+    Experiment,
+    ExperimentBatch,
+    ExperimentIds,
+    ExperimentStep,
+    SearchFilters,
+    TranslationRequest,
+    TranslationResponse,
+)
+from media import MediaCache, MediaProxy, is_safe_path, media_response, media_type_for
+from pagination import decode_cursor, encode_cursor, query_hash, resume_offset
+from responses import (
+    NDJSON_MEDIA_TYPE,
+    EncodedBody,
+    ResponseCache,
+    StaleWarningMiddleware,
+    dump_json,
+    encoded_response,
+    ndjson_chunks,
+    wants_ndjson,
+)
+from shared import LOCK_FILE, LoaderLock, SharedClient
+from snapshot import Snapshot
+from store import SUMMARY_FIELDS, ExperimentStore, StoreRegistry
+from upstream import CircuitBreaker, CircuitOpenError, SingleFlight, UpstreamClient
+
+if TYPE_CHECKING:
+    from translation import TranslationService
+
+# Startup timings in seconds, reported by /api/readyz
+STARTUP_REPORT: Dict[str, Any] = {
+    "imports": {
+        "framework": round(_framework_imported - _import_started, 4),
+        "app_modules": round(time.perf_counter() - _framework_imported, 4),
+    },
+}
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_workers()
+    STARTUP_REPORT["role"] = _role
+    started = time.perf_counter()
+    restore_snapshot()
+    STARTUP_REPORT["snapshot_restore"] = round(time.perf_counter() - started, 4)
+    tasks = [asyncio.create_task(warmup_until_ready())]
+    if _loader_lock is not None:
+        tasks.append(asyncio.create_task(coordinate_workers()))
+    yield
+    for task in tasks:
+        task.cancel()
+    if _loader_lock is not None:
+        _loader_lock.release()
+    await upstream.aclose()
+    if _translations is not None:
+        await _translations.aclose()
+
 # Create the main app
-app = FastAPI(title="Alltagslabor API", version="1.0.0")
+app = FastAPI(title="Alltagslabor API", version="1.0.0", lifespan=lifespan)
 
-# Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+# Create a router with the /api prefix (routes report latency and Server-Timing stages)
+api_router = APIRouter(prefix="/api", route_class=TimedRoute, default_response_class=TimedJSONResponse)
 
 # GitLab repository URLs
-GITLAB_BASE_URL = "https://gitlab.com/Datenflix007/alltagslabordata/-/raw/main"
-
-# Define Models
-class ExperimentStep(BaseModel):
-    type: str
-    content: str
-    description: Optional[str] = ""
-
-class Experiment(BaseModel):
-    title: str
-    shortDescription: str
-    subject: str
-    gradeLevel: str
-    steps: List[ExperimentStep]
-    schoolType: str
-
-class SearchFilters(BaseModel):
-    subject: Optional[str] = None
-    gradeLevel: Optional[str] = None
-    schoolType: Optional[str] = None
-    freetext: Optional[str] = None
-
-# Cache for data
-_cache = {}
+GITLAB_BASE_URL = os.environ.get(
+    "GITLAB_BASE_URL", "https://gitlab.com/Datenflix007/alltagslabordata/-/raw/main"
+)
 
-async def fetch_json_data(filename: str) -> Dict[str, Any]:
-    """Fetch JSON data from GitLab repository with caching"""
-    if filename not in _cache:
+# Cache lifetimes for upstream files (seconds)
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", "300"))
+CACHE_TTLS = {
+    "subjects.json": 3600.0,
+    "typeOfSchoole.json": 3600.0,
+    "impressum.txt": 3600.0,
+}
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Circuit breaker for GitLab: consecutive failures that open it, seconds until a probe request
+UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get("UPSTREAM_FAILURE_THRESHOLD", "5"))
+UPSTREAM_RESET_SECONDS = float(os.environ.get("UPSTREAM_RESET_SECONDS", "30"))
+
+# Experiment datasets per language; requests without lang use the original file
+DEFAULT_DATASET = "_experiments.json"
+DATASET_FILES = {
+    "de": "_experiments_de.json",
+    "en": "_experiments_eng.json",
+    "fr": "_experiments_fr.json",
+    "ru": "_experiments_ru.json",
+    "uk": "_experiments_uk.json",
+}
+
+# Estimated memory for parsed datasets and their indexes across all languages
+STORE_MEMORY_BUDGET = int(os.environ.get("STORE_MEMORY_BUDGET", str(256 * 1024 * 1024)))
+
+# Upstream files loaded before the instance reports ready, with their kind;
+# datasets are cached as bytes and only parsed while building their store
+UPSTREAM_FILES = {
+    "_experiments.json": "bytes",
+    "subjects.json": "json",
+    "typeOfSchoole.json": "json",
+    "impressum.txt": "text",
+}
+# Additional dataset languages to index during warmup (comma-separated)
+PREWARM_LANGUAGES = [lang.strip() for lang in os.environ.get("PREWARM_LANGUAGES", "").split(",") if lang.strip()]
+# First retry delay after a failed warmup; doubles up to WARMUP_MAX_RETRY_DELAY
+WARMUP_RETRY_DELAY = 1.0
+WARMUP_MAX_RETRY_DELAY = 30.0
+
+# Shared translation cache and the backend used for cache misses
+TRANSLATION_CACHE_PATH = Path(os.environ.get("TRANSLATION_CACHE_PATH", str(ROOT_DIR / "data" / "translations.sqlite3")))
+TRANSLATOR = os.environ.get("TRANSLATOR", "google")
+TRANSLATION_CONCURRENCY = int(os.environ.get("TRANSLATION_CONCURRENCY", "4"))
+
+# Disk cache for proxied images and audio (content-addressed, LRU)
+MEDIA_CACHE_DIR = Path(os.environ.get("MEDIA_CACHE_DIR", str(ROOT_DIR / "data" / "media")))
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+MEDIA_TTL_SECONDS = float(os.environ.get("MEDIA_TTL_SECONDS", "86400"))
+
+# Last good upstream data and prebuilt indexes for warm starts (empty to disable)
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", str(ROOT_DIR / "data" / "snapshot"))
+# Serve only from the snapshot and never contact GitLab or the translator
+OFFLINE_MODE = os.environ.get("OFFLINE_MODE", "").lower() in ("1", "true", "yes")
+
+# Multi-worker mode: one loader process fetches GitLab and builds the indexes,
+# publishing both through SNAPSHOT_DIR; the other workers only read from there.
+# uvicorn reads WEB_CONCURRENCY as its default worker count as well.
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+SHARED_WORKERS = os.environ.get("SHARED_WORKERS", "1" if WORKERS > 1 else "").lower() in ("1", "true", "yes")
+# How often workers check for new versions (and whether the loader is gone)
+SHARED_POLL_SECONDS = float(os.environ.get("SHARED_POLL_SECONDS", "5"))
+# How long workers wait for the loader to publish data it is still loading
+SHARED_WAIT_SECONDS = float(os.environ.get("SHARED_WAIT_SECONDS", "10"))
+
+# Shared async client for upstream requests (connection pool, circuit breaker)
+upstream = UpstreamClient(
+    GITLAB_BASE_URL,
+    breaker=CircuitBreaker(failure_threshold=UPSTREAM_FAILURE_THRESHOLD, reset_timeout=UPSTREAM_RESET_SECONDS),
+)
+
+_snapshot: Optional[Snapshot] = Snapshot(Path(SNAPSHOT_DIR)) if SNAPSHOT_DIR else None
+
+def run_in_background(fn, *args):
+    """Run blocking work (e.g. snapshot writes) in a thread without awaiting it"""
+    def run():
         try:
-            url = f"{GITLAB_BASE_URL}/{filename}"
-            response = requests.get(url)
-            response.raise_for_status()
-            _cache[filename] = response.json()
+            fn(*args)
         except Exception as e:
-            logger.error(f"Error fetching {filename}: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
-    return _cache[filename]
+            logger.warning(f"Background task {fn.__name__} failed: {str(e)}")
+    asyncio.get_running_loop().run_in_executor(None, run)
+
+def save_snapshot_file(filename: str, entry: CacheEntry, content: bytes):
+    if _snapshot is not None:
+        run_in_background(_snapshot.save_file, filename, entry, content)
+
+def publish_if_missing(filename: str, entry: CacheEntry, content: bytes):
+    """Workers only publish files the loader has not published (and so does not refresh) yet"""
+    def publish():
+        if _snapshot.file_header(filename) is None:
+            _snapshot.save_file(filename, entry, content)
+    if _snapshot is not None:
+        run_in_background(publish)
+
+def load_snapshot_file(filename: str) -> Optional[CacheEntry]:
+    """Last known good copy of an upstream file, for when GitLab cannot be reached"""
+    return _snapshot.load_file(filename) if _snapshot is not None else None
+
+# Cache for data (TTL + ETag revalidation, stale-while-revalidate)
+_cache = UpstreamCache(
+    upstream,
+    default_ttl=CACHE_TTL_SECONDS,
+    ttls=CACHE_TTLS,
+    max_bytes=CACHE_MAX_BYTES,
+    on_update=save_snapshot_file,
+    offline=OFFLINE_MODE,
+    fallback=load_snapshot_file,
+)
+
+def forget_responses(source: str):
+    # Encoded bodies are as large as the store itself but not in its budget
+    _responses.discard_source(source)
+
+# Parsed experiments and indexes per dataset file, loaded on first use
+_stores = StoreRegistry(budget_bytes=STORE_MEMORY_BUDGET, on_evict=forget_responses)
+
+# Encoded (and compressed) bodies of read-only responses per dataset version
+_responses = ResponseCache()
+
+# Stores being restored or built, per dataset file and version
+_store_loads = SingleFlight()
+
+# "single", or "loader"/"worker" in multi-worker mode
+_role = "single"
+_loader_lock: Optional[LoaderLock] = None
+
+# Created on first use so the SQLite file is only opened when needed
+_translations: Optional["TranslationService"] = None
+
+# Created on first use so the media directory is only scanned when needed
+_media: Optional[MediaProxy] = None
+
+# Set once all upstream files are loaded and the default dataset is indexed
+_ready = False
+
+def upstream_error(filename: str, e: Exception) -> HTTPException:
+    """HTTP error for a failed upstream fetch
+
+    503 without waiting while the circuit is open, and for files that are
+    not in the snapshot in offline mode.
+    """
+    if isinstance(e, LookupError):
+        logger.warning(f"Not fetching {filename}: {str(e)}")
+        return HTTPException(status_code=503, detail=f"Data not available: {str(e)}")
+    if isinstance(e, CircuitOpenError):
+        logger.warning(f"Not fetching {filename}: {str(e)}")
+        return HTTPException(
+            status_code=503,
+            detail=f"Error fetching data: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    logger.error(f"Error fetching {filename}: {str(e)}")
+    return HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
+
+async def fetch_json_entry(filename: str) -> CacheEntry:
+    """Fetch a cached JSON entry (value plus version info) from GitLab repository"""
+    try:
+        with stage("fetch"):
+            return await _cache.get_entry(filename, kind="json")
+    except Exception as e:
+        raise upstream_error(filename, e)
+
+async def fetch_json_data(filename: str) -> Dict[str, Any]:
+    """Fetch JSON data from GitLab repository with caching"""
+    return (await fetch_json_entry(filename)).value
+
+async def fetch_text_entry(filename: str) -> CacheEntry:
+    """Fetch a cached text entry (value plus version info) from GitLab repository"""
+    try:
+        with stage("fetch"):
+            return await _cache.get_entry(filename, kind="text")
+    except Exception as e:
+        raise upstream_error(filename, e)
+
+async def fetch_bytes_entry(filename: str) -> CacheEntry:
+    """Fetch a cached file (raw bytes plus version info) from GitLab repository"""
+    try:
+        with stage("fetch"):
+            return await _cache.get_entry(filename, kind="bytes")
+    except Exception as e:
+        raise upstream_error(filename, e)
 
 async def fetch_text_data(filename: str) -> str:
     """Fetch text data from GitLab repository with caching"""
-    if filename not in _cache:
+    return (await fetch_text_entry(filename)).value
+
+def dataset_file(lang: Optional[str]) -> str:
+    """Upstream file holding the experiments in the given language"""
+    if not lang:
+        return DEFAULT_DATASET
+    filename = DATASET_FILES.get(lang.lower())
+    if filename is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {lang}")
+    return filename
+
+async def get_experiment_store(lang: Optional[str] = None) -> ExperimentStore:
+    """Get the experiment store for a language, rebuilding it only when the dataset changed"""
+    return await store_for_file(dataset_file(lang))
+
+async def store_for_file(filename: str, wait: bool = False) -> ExperimentStore:
+    """The store for the current version of a dataset file
+
+    A new version is restored or built off the event loop, once however many
+    requests ask for it. Until it is ready the previous version keeps being
+    served; only a first load (or wait=True) waits for it.
+    """
+    entry = await fetch_bytes_entry(filename)
+    store = _stores.lookup(filename, entry.digest)
+    if store is not None:
+        return store
+    key = f"{filename}:{entry.digest}"
+    previous = _stores.peek(filename)
+    if previous is not None and not wait:
+        _store_loads.start(key, lambda: load_store(filename, entry))
+        return previous
+    with stage("index"):
+        return await _store_loads.do(key, lambda: load_store(filename, entry))
+
+async def load_store(filename: str, entry: CacheEntry) -> ExperimentStore:
+    try:
+        restored = None
+        if _snapshot is not None:
+            # Use the store the loader process (or a previous run) already built
+            restored = await load_published_store(filename, entry.digest)
+        if restored is not None:
+            store, size = restored
+        else:
+            store = await run_in_threadpool(_stores.build, filename, entry.value, entry.digest, entry.version)
+            size = entry.size
+            if _snapshot is not None and _role != "worker":
+                run_in_background(_snapshot.save_store, filename, store, size)
+    except Exception as e:
+        logger.warning(f"Loading experiments from {filename} failed: {str(e)}")
+        raise
+    current = _cache.peek(filename)
+    # A newer version may have been fetched while this one was loading
+    if current is None or current.digest == entry.digest:
+        _stores.seed(filename, store, size)
+    return store
+
+async def load_published_store(filename: str, digest: str):
+    """The snapshotted store for a digest; workers give the loader time to publish it
+
+    Workers only wait for the datasets the loader indexes during warmup;
+    other languages are built by the first worker that needs them.
+    """
+    wait = SHARED_WAIT_SECONDS if _role == "worker" and filename in loader_datasets() else 0.0
+    deadline = time.monotonic() + wait
+    while True:
+        restored = await run_in_threadpool(_snapshot.load_store, filename, digest)
+        if restored is not None or time.monotonic() >= deadline:
+            return restored
+        await asyncio.sleep(0.1)
+
+def configure_workers():
+    """In multi-worker mode, elect this process as loader or worker"""
+    global _loader_lock
+    if not SHARED_WORKERS or OFFLINE_MODE:
+        return
+    if _snapshot is None:
+        logger.warning("Multi-worker mode needs SNAPSHOT_DIR; every worker loads on its own")
+        return
+    _loader_lock = LoaderLock(_snapshot.directory / LOCK_FILE)
+    if _loader_lock.try_acquire():
+        become_loader()
+    else:
+        become_worker()
+    logger.info(f"Running as {_role} (pid {os.getpid()})")
+
+def become_loader():
+    global _role
+    _role = "loader"
+    _cache.client = upstream
+    _cache.default_ttl = CACHE_TTL_SECONDS
+    _cache.ttls = dict(CACHE_TTLS)
+    _cache.on_update = save_snapshot_file
+
+def loader_datasets() -> List[str]:
+    """Dataset files the loader indexes (and publishes) during warmup"""
+    return [dataset_file(lang) for lang in [None] + PREWARM_LANGUAGES]
+
+def become_worker():
+    global _role
+    _role = "worker"
+    loaded = set(UPSTREAM_FILES) | set(loader_datasets())
+    _cache.client = SharedClient(_snapshot, fallback=upstream, expected=loaded, wait=SHARED_WAIT_SECONDS)
+    # Checking for a new version is a header read, so workers poll often
+    _cache.default_ttl = SHARED_POLL_SECONDS
+    _cache.ttls = {}
+    _cache.on_update = publish_if_missing
+
+async def refresh_published():
+    """Revalidate every published file and rebuild its store, so workers see all updates"""
+    published = await run_in_threadpool(_snapshot.published_files)
+    for filename, kind in published.items():
         try:
-            url = f"{GITLAB_BASE_URL}/{filename}"
-            response = requests.get(url)
-            response.raise_for_status()
-            _cache[filename] = response.text
+            await _cache.refresh(filename, kind=kind)
+            if filename == DEFAULT_DATASET or filename in DATASET_FILES.values():
+                await store_for_file(filename, wait=True)
         except Exception as e:
-            logger.error(f"Error fetching {filename}: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
-    return _cache[filename]
+            logger.warning(f"Refreshing published {filename} failed: {str(e)}")
+
+async def coordinate_workers():
+    """Loader: keep published data fresh. Worker: take over when the loader exits"""
+    while True:
+        await asyncio.sleep(SHARED_POLL_SECONDS if _role == "worker" else CACHE_TTL_SECONDS)
+        if _role == "worker":
+            if _loader_lock.try_acquire():
+                become_loader()
+                logger.info(f"Took over as loader (pid {os.getpid()})")
+            continue
+        await refresh_published()
+
+def restore_snapshot():
+    """Seed the caches from the on-disk snapshot; entries are refreshed on first use"""
+    if _snapshot is None:
+        return
+    entries = _snapshot.load_files()
+    for filename, entry in entries.items():
+        _cache.seed(filename, entry)
+        if filename == DEFAULT_DATASET or filename in DATASET_FILES.values():
+            restored = _snapshot.load_store(filename, entry.digest)
+            if restored is not None:
+                _stores.seed(filename, *restored)
+    if entries:
+        logger.info(f"Restored {len(entries)} files and {len(_stores)} experiment stores from snapshot")
+
+async def cached_json_response(
+    request: Request, key: str, version: str, build, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Serve build() as pre-encoded JSON, encoded once per source version"""
+    with stage("encode"):
+        body = await _responses.get(key, version, build)
+    return encoded_response(request, body, headers)
+
+def get_translation_service() -> "TranslationService":
+    global _translations
+    if _translations is None:
+        # Imported lazily: only instances that actually translate need sqlite3
+        from translation import TRANSLATORS, TranslationCache, TranslationService
+
+        translator = TRANSLATORS.get(TRANSLATOR)
+        if translator is None:
+            raise HTTPException(status_code=500, detail=f"Unknown translator: {TRANSLATOR}")
+        _translations = TranslationService(
+            TranslationCache(TRANSLATION_CACHE_PATH),
+            translator(),
+            concurrency=TRANSLATION_CONCURRENCY,
+            offline=OFFLINE_MODE,
+        )
+    return _translations
+
+def get_media_proxy() -> MediaProxy:
+    global _media
+    if _media is None:
+        _media = MediaProxy(
+            upstream,
+            MediaCache(MEDIA_CACHE_DIR, max_bytes=MEDIA_CACHE_MAX_BYTES),
+            ttl=MEDIA_TTL_SECONDS,
+            offline=OFFLINE_MODE,
+        )
+    return _media
+
+async def prewarm() -> Dict[str, float]:
+    """Fetch all upstream files and build the experiment indexes; returns timings"""
+    timings: Dict[str, float] = {}
+
+    async def timed(name: str, coro):
+        started = time.perf_counter()
+        await coro
+        timings[name] = round(time.perf_counter() - started, 4)
+
+    await asyncio.gather(*[
+        timed(f"fetch:{filename}", _cache.get_entry(filename, kind=kind))
+        for filename, kind in UPSTREAM_FILES.items()
+    ])
+    for filename in loader_datasets():
+        await timed(f"index:{filename}", store_for_file(filename, wait=True))
+    return timings
+
+async def warmup_until_ready():
+    """Prewarm in the background, retrying with backoff until it succeeds"""
+    global _ready
+    started = time.perf_counter()
+    delay = WARMUP_RETRY_DELAY
+    attempt = 1
+    while True:
+        try:
+            steps = await prewarm()
+            break
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.warning(f"Warmup attempt {attempt} failed, retrying in {delay:.0f}s: {detail}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_MAX_RETRY_DELAY)
+            attempt += 1
+
+    STARTUP_REPORT["warmup"] = {
+        "total": round(time.perf_counter() - started, 4),
+        "attempts": attempt,
+        "steps": steps,
+    }
+    _ready = True
+    logger.info(f"Ready: {json.dumps(STARTUP_REPORT)}")
+
+@api_router.get("/metrics")
+async def metrics():
+    """Prometheus metrics of this process"""
+    CACHE_BYTES.set(_cache.size)
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@api_router.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@api_router.get("/readyz")
+async def readyz():
+    """Readiness: all upstream data is loaded and indexed"""
+    if not _ready:
+        return JSONResponse({"status": "warming", "startup": STARTUP_REPORT}, status_code=503)
+    return {"status": "ready", "startup": STARTUP_REPORT}
 
 @api_router.get("/")
 async def root():
     return {"message": "Alltagslabor API", "version": "1.0.0"}
 
+def parse_fields(fields: Optional[str], view: Optional[str]) -> Optional[List[str]]:
+    """Resolve the fields= projection and view=summary into a list of field names"""
+    if view not in (None, "full", "summary"):
+        raise HTTPException(status_code=400, detail=f"Unknown view: {view}")
+    if not fields:
+        return list(SUMMARY_FIELDS) if view == "summary" else None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in Experiment.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+# Listings are JSON or NDJSON depending on the Accept header
+NEGOTIATED_VARY = "Accept, Accept-Encoding"
+
+def list_experiments(
+    store: ExperimentStore,
+    fields: Optional[List[str]],
+    limit: Optional[int],
+    cursor: Optional[str],
+    offset: int = 0,
+    **filters,
+):
+    """Run a (filtered) listing with cursor pagination and optional field projection"""
+    query = query_hash(filters, fields)
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+            after_position = store.by_id.get(position.after_id) if position.after_id else None
+            ordered = None if filters.get("freetext") else (lambda: store.search_positions(**filters))
+            with stage("filter"):
+                offset = resume_offset(position, store.digest, query, ordered, after_position)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    with stage("filter"):
+        page = store.search_positions(**filters, limit=None if limit is None else limit + 1, offset=offset)
+    headers = {}
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        last_id = store.experiments[page[-1]].id
+        headers["X-Next-Cursor"] = encode_cursor(store.digest, offset + limit, last_id, query)
+    if filters:
+        SEARCH_RESULTS.observe(len(page), kind="freetext" if filters.get("freetext") else "filter")
+
+    # The same URL streams NDJSON when asked to
+    headers["Vary"] = NEGOTIATED_VARY
+    with stage("serialize"):
+        if fields is None:
+            # Validated when the store was built, so joined as they are
+            return Response(store.encode(page), media_type="application/json", headers=headers)
+        return JSONResponse([store.project(i, fields) for i in page], headers=headers)
+
+def stream_experiments(
+    store: ExperimentStore,
+    fields: Optional[List[str]],
+    limit: Optional[int],
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    **filters,
+) -> StreamingResponse:
+    """Stream a (filtered) listing as NDJSON, encoding one experiment at a time
+
+    Only the matching positions are collected up front; experiments are
+    projected and encoded while the response is sent, in a worker thread.
+    """
+    if cursor:
+        raise HTTPException(status_code=400, detail="Cursors are not supported for NDJSON streams, use offset")
+    with stage("filter"):
+        if any(filters.values()):
+            positions = store.search_positions(**filters, limit=limit, offset=offset)
+            SEARCH_RESULTS.observe(len(positions), kind="freetext" if filters.get("freetext") else "filter")
+        else:
+            positions = range(len(store))[offset:None if limit is None else offset + limit]
+    if fields is None:
+        items = (store.experiments[position].encoded for position in positions)
+    else:
+        items = (store.project(position, fields) for position in positions)
+    return StreamingResponse(ndjson_chunks(items), media_type=NDJSON_MEDIA_TYPE, headers={"Vary": NEGOTIATED_VARY})
+
 @api_router.get("/experiments", response_model=List[Experiment])
-async def get_experiments():
-    """Get all experiments"""
-    data = await fetch_json_data("_experiments.json")
-    return [Experiment(**exp) for exp in data]
+async def get_experiments(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    view: Optional[str] = Query(None, description="'summary' for a listing without steps"),
+    limit: Optional[int] = Query(None, ge=1, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
+    """Get all experiments (as NDJSON with Accept: application/x-ndjson)"""
+    store = await get_experiment_store(lang)
+    if wants_ndjson(request):
+        return stream_experiments(store, parse_fields(fields, view), limit, cursor)
+    if not fields and limit is None and not cursor:
+        headers = {"Vary": NEGOTIATED_VARY}
+        if view == "summary":
+            return await cached_json_response(
+                request, f"experiments:summary:{store.source}", store.digest, lambda: store.summaries, headers
+            )
+        if view in (None, "full"):
+            return await cached_json_response(
+                request,
+                f"experiments:{store.source}",
+                store.digest,
+                lambda: store.encode(range(len(store))),
+                headers,
+            )
+    return list_experiments(store, parse_fields(fields, view), limit, cursor)
 
 @api_router.get("/experiments/search", response_model=List[Experiment])
 async def search_experiments(
+    request: Request,
+    subject: Optional[str] = Query(None, description="Subject to filter by"),
+    gradeLevel: Optional[str] = Query(None, description="Grade level to filter by"),
+    schoolType: Optional[str] = Query(None, description="School type to filter by"),
+    freetext: Optional[str] = Query(None, description="Free text search"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of results"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    view: Optional[str] = Query(None, description="'summary' for a listing without steps"),
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
+    """Search experiments with filters, ranked by relevance for free text"""
+    store = await get_experiment_store(lang)
+    projection = parse_fields(fields, view)
+    filters = {"subject": subject, "gradeLevel": gradeLevel, "schoolType": schoolType, "freetext": freetext}
+    if wants_ndjson(request):
+        return stream_experiments(store, projection, limit, cursor, offset=offset, **filters)
+    return list_experiments(store, projection, limit, cursor, offset=offset, **filters)
+
+@api_router.get("/experiments/stream")
+async def stream_search_experiments(
     subject: Optional[str] = Query(None, description="Subject to filter by"),
     gradeLevel: Optional[str] = Query(None, description="Grade level to filter by"),
     schoolType: Optional[str] = Query(None, description="School type to filter by"),
-    freetext: Optional[str] = Query(None, description="Free text search")
+    freetext: Optional[str] = Query(None, description="Free text search"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of results"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    view: Optional[str] = Query(None, description="'summary' for a listing without steps"),
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
+    """Export experiments as NDJSON, one per line, with the filters of /experiments/search"""
+    store = await get_experiment_store(lang)
+    return stream_experiments(
+        store,
+        parse_fields(fields, view),
+        limit,
+        offset=offset,
+        subject=subject,
+        gradeLevel=gradeLevel,
+        schoolType=schoolType,
+        freetext=freetext,
+    )
+
+@api_router.get("/experiments/suggest")
+async def suggest_experiments(
+    q: str = Query("", description="Text typed so far"),
+    limit: int = Query(8, ge=1, le=16, description="Maximum number of suggestions"),
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
+    """Completions for the search box: titles, subjects and terms, tolerating typos"""
+    store = await get_experiment_store(lang)
+    with stage("suggest"):
+        suggestions = store.suggest_index.suggest(q, limit)
+    return {"query": q, "version": store.dataset_version, "suggestions": suggestions}
+
+@api_router.get("/experiments/by-id/{experiment_id}", response_model=Experiment)
+async def get_experiment_by_id(
+    experiment_id: str,
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
+    """Get a specific experiment by its stable ID"""
+    store = await get_experiment_store(lang)
+    position = store.by_id.get(experiment_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    return Response(store.experiments[position].encoded, media_type="application/json")
+
+@api_router.post("/experiments/by-id", response_model=ExperimentBatch)
+async def get_experiments_by_ids(
+    request: ExperimentIds,
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
+    """Get several experiments by ID in one request, in the requested order"""
+    store = await get_experiment_store(lang)
+    positions = []
+    missing = []
+    for experiment_id in request.ids:
+        position = store.by_id.get(experiment_id)
+        if position is None:
+            missing.append(experiment_id)
+        else:
+            positions.append(position)
+    body = b'{"experiments":' + store.encode(positions) + b',"missing":' + dump_json(missing) + b"}"
+    return Response(body, media_type="application/json")
+
+@api_router.get("/experiments/changes")
+async def get_experiment_changes(
+    request: Request,
+    since: Optional[str] = Query(None, description="Dataset version the client already has"),
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
 ):
-    """Search experiments with filters"""
-    experiments_data = await fetch_json_data("_experiments.json")
-    experiments = [Experiment(**exp) for exp in experiments_data]
-    
-    filtered_experiments = experiments
-    
-    # Apply subject filter
-    if subject:
-        filtered_experiments = [exp for exp in filtered_experiments if exp.subject.lower() == subject.lower()]
-    
-    # Apply grade level filter
-    if gradeLevel:
-        filtered_experiments = [exp for exp in filtered_experiments if exp.gradeLevel == gradeLevel]
-    
-    # Apply school type filter
-    if schoolType:
-        filtered_experiments = [exp for exp in filtered_experiments if exp.schoolType.lower() == schoolType.lower()]
-    
-    # Apply free text search
-    if freetext:
-        search_term = freetext.lower()
-        filtered_experiments = [
-            exp for exp in filtered_experiments 
-            if (search_term in exp.title.lower() or 
-                search_term in exp.shortDescription.lower() or
-                any(search_term in step.content.lower() for step in exp.steps))
-        ]
-    
-    return filtered_experiments
+    """Experiments added, modified and removed since a dataset version
+
+    Without a version, or when it is too old, the full dataset is returned
+    with full=true and the client should replace its copy.
+    """
+    store = await get_experiment_store(lang)
+    version = store.dataset_version
+    delta = _stores.changes(store.source, store, since) if since else None
+    if delta is None:
+        return await cached_json_response(
+            request,
+            f"changes:full:{store.source}",
+            store.digest,
+            lambda: {
+                "version": version,
+                "full": True,
+                "experiments": [exp.model_dump() for exp in store.experiments],
+            },
+        )
+
+    def build():
+        return EncodedBody.from_json({
+            "version": version,
+            "since": since,
+            "full": False,
+            "added": [store.project(position) for position in delta["added"]],
+            "modified": [store.project(position) for position in delta["modified"]],
+            "removed": delta["removed"],
+        })
+
+    return encoded_response(request, await run_in_threadpool(build))
 
 @api_router.get("/experiments/{experiment_title}")
-async def get_experiment_by_title(experiment_title: str):
-    """Get a specific experiment by title"""
-    experiments_data = await fetch_json_data("_experiments.json")
-    
-    for exp in experiments_data:
-        if exp["title"] == experiment_title:
-            return Experiment(**exp)
-    
-    raise HTTPException(status_code=404, detail="Experiment not found")
+async def get_experiment_by_title(
+    experiment_title: str,
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
+    """Get a specific experiment by title (compatibility alias for by-id)"""
+    store = await get_experiment_store(lang)
+    position = store.by_title.get(experiment_title)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    return Response(store.experiments[position].encoded, media_type="application/json")
 
 @api_router.get("/subjects")
-async def get_subjects():
+async def get_subjects(request: Request):
     """Get all subjects by state"""
-    return await fetch_json_data("subjects.json")
+    entry = await fetch_json_entry("subjects.json")
+    return await cached_json_response(request, "subjects", entry.digest, lambda: entry.value)
 
 @api_router.get("/school-types")
-async def get_school_types():
+async def get_school_types(request: Request):
     """Get all school types by state"""  
-    return await fetch_json_data("typeOfSchoole.json")
+    entry = await fetch_json_entry("typeOfSchoole.json")
+    return await cached_json_response(request, "school-types", entry.digest, lambda: entry.value)
 
 @api_router.get("/grades")
-async def get_grades():
+async def get_grades(
+    request: Request,
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
     """Get available grade levels"""
-    experiments_data = await fetch_json_data("_experiments.json")
-    grades = list(set([exp["gradeLevel"] for exp in experiments_data]))
-    return sorted(grades, key=lambda x: int(x) if x.isdigit() else float('inf'))
+    store = await get_experiment_store(lang)
+    return await cached_json_response(request, f"grades:{store.source}", store.digest, lambda: store.grades)
+
+@api_router.get("/facets")
+async def get_facets(
+    request: Request,
+    subject: Optional[str] = Query(None, description="Active subject filter"),
+    gradeLevel: Optional[str] = Query(None, description="Active grade level filter"),
+    schoolType: Optional[str] = Query(None, description="Active school type filter"),
+    freetext: Optional[str] = Query(None, description="Active free text search"),
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
+    """Experiment counts per subject, grade level and school type under the current filters"""
+    store = await get_experiment_store(lang)
+    if not (subject or gradeLevel or schoolType or freetext):
+        return await cached_json_response(request, f"facets:{store.source}", store.digest, store.facet_counts)
+    return store.facet_counts(subject, gradeLevel, schoolType, freetext)
 
 @api_router.get("/impressum")
-async def get_impressum():
+async def get_impressum(request: Request):
     """Get impressum text"""
-    text = await fetch_text_data("impressum.txt")
-    return {"content": text}
+    entry = await fetch_text_entry("impressum.txt")
+    return await cached_json_response(request, "impressum", entry.digest, lambda: {"content": entry.value})
+
+@api_router.get("/bootstrap")
+async def get_bootstrap(
+    request: Request,
+    view: Optional[str] = Query(None, description="'summary' for experiments without steps"),
+    lang: Optional[str] = Query(None, description="Dataset language (de, en, fr, ru, uk)")
+):
+    """Everything the app needs on launch in one response with a single ETag"""
+    if view not in (None, "full", "summary"):
+        raise HTTPException(status_code=400, detail=f"Unknown view: {view}")
+    store, subjects, school_types, impressum = await asyncio.gather(
+        get_experiment_store(lang),
+        fetch_json_entry("subjects.json"),
+        fetch_json_entry("typeOfSchoole.json"),
+        fetch_text_entry("impressum.txt"),
+    )
+    digests = (store.digest, subjects.digest, school_types.digest, impressum.digest)
+    version = hashlib.sha256("".join(digests).encode("ascii")).hexdigest()[:16]
+
+    def build():
+        if view == "summary":
+            experiments = store.summaries
+        else:
+            experiments = [exp.model_dump() for exp in store.experiments]
+        return {
+            "version": version,
+            "experiments": experiments,
+            "subjects": subjects.value,
+            "schoolTypes": school_types.value,
+            "grades": store.grades,
+            "impressum": {"content": impressum.value},
+        }
+
+    key = f"bootstrap:{view or 'full'}:{store.source}"
+    return await cached_json_response(request, key, version, build)
+
+@api_router.post("/translate", response_model=TranslationResponse)
+async def translate_texts(request: TranslationRequest):
+    """Translate a batch of strings through the shared translation cache"""
+    service = get_translation_service()
+    return await service.translate(request.texts, target=request.target, source=request.source)
+
+@api_router.get("/media/{path:path}")
+async def get_media(
+    request: Request,
+    path: str,
+    w: Optional[int] = Query(None, ge=1, le=4096, description="Resize images to (at most) this width"),
+):
+    """Image, audio and video files from GitLab through the media cache, with byte ranges"""
+    media_type = media_type_for(path)
+    if not is_safe_path(path) or media_type is None:
+        raise HTTPException(status_code=400, detail=f"Not a media file: {path}")
+
+    proxy = get_media_proxy()
+    try:
+        entry = await proxy.original(path)
+    except LookupError as e:
+        if proxy.offline:
+            # Not in the media cache, but it may well exist upstream
+            raise upstream_error(path, e)
+        raise HTTPException(status_code=404, detail=f"Media not found: {path}")
+    except Exception as e:
+        raise upstream_error(path, e)
+
+    headers = {"Cache-Control": f"public, max-age={int(MEDIA_TTL_SECONDS)}"}
+    if w is not None and media_type.startswith("image/"):
+        webp = "image/webp" in request.headers.get("accept", "")
+        entry = await proxy.variant(entry, w, webp=webp)
+        headers["Vary"] = "Accept"
+    return await media_response(request, proxy.cache, entry, headers)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -161,8 +895,14 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "Accept-Ranges", "Server-Timing", "Warning"],
 )
 
+app.add_middleware(StaleWarningMiddleware)
+
+# Outermost, so latency includes CORS handling
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -172,4 +912,8 @@ logger = logging.getLogger(__name__)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    if WORKERS > 1:
+        # Worker processes import the app themselves
+        uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=WORKERS, app_dir=str(ROOT_DIR))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Container, Dict, Optional
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from snapshot import Snapshot
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where every worker loads on its own
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = "loader.lock"
+
+
+class LoaderLock:
+    """Non-blocking exclusive file lock that elects one loader among worker processes
+
+    The lock is released by the OS when the holder exits, so a surviving
+    worker can take over by calling try_acquire again.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class SharedClient:
+    """Reads upstream files from the snapshot directory the loader process publishes
+
+    A drop-in for UpstreamClient in worker processes: it answers with the
+    published bytes, or 304 when the ETag the cache holds is still current,
+    so the UpstreamCache logic (TTL, stale-while-revalidate, versions) works
+    unchanged. The loader replaces files atomically, so a read always sees
+    one complete version. Files nobody has published yet are fetched from
+    the fallback client, if any; for the expected files (those the loader
+    fetches itself) the loader gets up to `wait` seconds to publish first.
+    """
+
+    def __init__(self, snapshot: Snapshot, fallback=None, expected: Container[str] = (), wait: float = 0.0):
+        self.snapshot = snapshot
+        self.fallback = fallback
+        self.expected = expected
+        self.wait = wait
+
+    @staticmethod
+    def etag(header: Dict) -> str:
+        return f'"{header["digest"]}"'
+
+    async def get(
+        self, filename: str, headers: Optional[Dict[str, str]] = None, label: Optional[str] = None
+    ) -> httpx.Response:
+        request = httpx.Request("GET", f"http://shared/{filename}")
+        if_none_match = (headers or {}).get("If-None-Match")
+        if if_none_match:
+            header = await run_in_threadpool(self.snapshot.file_header, filename)
+            if header is not None and self.etag(header) == if_none_match:
+                return httpx.Response(304, headers={"etag": if_none_match}, request=request)
+
+        published = await run_in_threadpool(self.snapshot.read_file, filename)
+        if published is None and filename in self.expected:
+            deadline = time.monotonic() + self.wait
+            while published is None and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+                published = await run_in_threadpool(self.snapshot.read_file, filename)
+        if published is None:
+            if self.fallback is not None:
+                return await self.fallback.get(filename, label=label)
+            response = httpx.Response(404, request=request)
+            response.raise_for_status()
+        header, content = published
+        return httpx.Response(200, content=content, headers={"etag": self.etag(header)}, request=request)
+
+    async def aclose(self):
+        pass
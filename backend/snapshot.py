@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import pickle
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple
+from urllib.parse import quote
+
+from cache import CacheEntry
+from store import STORE_FORMAT, ExperimentStore
+
+logger = logging.getLogger(__name__)
+
+# File layout: magic, header length (uint32), JSON header, payload
+_MAGIC = b"ALS1"
+_HEADER = struct.Struct("<4sI")
+
+FILE_SUFFIX = ".file"
+STORE_SUFFIX = ".store"
+
+
+def _write_atomic(path: Path, header: Dict[str, Any], payload: bytes):
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(encoded)))
+            f.write(encoded)
+            f.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _read_header(f: BinaryIO, name: str) -> Dict[str, Any]:
+    magic, length = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != _MAGIC:
+        raise ValueError(f"{name} is not a snapshot file")
+    return json.loads(f.read(length))
+
+
+def _read(path: Path, check: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[Dict[str, Any], Optional[bytes]]:
+    """Header and payload of a snapshot file; the payload is skipped if check(header) fails"""
+    with open(path, "rb") as f:
+        header = _read_header(f, path.name)
+        if check is not None and not check(header):
+            return header, None
+        return header, f.read()
+
+
+def _cache_entry(header: Dict[str, Any], content: bytes) -> CacheEntry:
+    if header["kind"] == "json":
+        value = json.loads(content)
+    elif header["kind"] == "bytes":
+        value = content
+    else:
+        value = content.decode("utf-8")
+    return CacheEntry(
+        value=value,
+        etag=header["etag"],
+        digest=header["digest"],
+        size=len(content),
+        fetched_at=float("-inf"),
+        version=header["version"],
+        kind=header["kind"],
+    )
+
+
+class Snapshot:
+    """Last good upstream files and prebuilt experiment stores on local disk
+
+    Every upstream file is stored with its ETag, digest and version next to
+    the raw bytes. Experiment stores (validated experiment records plus all indexes) are
+    pickled, so a restart can serve them without parsing or indexing again.
+    Snapshot files are only ever written by this process; pickles from other
+    sources must never be placed in the directory.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+    def _path(self, name: str, suffix: str) -> Path:
+        return self.directory / (quote(name, safe="") + suffix)
+
+    def save_file(self, filename: str, entry: CacheEntry, content: bytes):
+        header = {
+            "filename": filename,
+            "etag": entry.etag,
+            "digest": entry.digest,
+            "version": entry.version,
+            "kind": entry.kind,
+        }
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            _write_atomic(self._path(filename, FILE_SUFFIX), header, content)
+
+    def save_store(self, key: str, store: ExperimentStore, size: int = 0):
+        payload = pickle.dumps(store, protocol=pickle.HIGHEST_PROTOCOL)
+        header = {"key": key, "digest": store.digest, "size": size, "format": STORE_FORMAT}
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            _write_atomic(self._path(key, STORE_SUFFIX), header, payload)
+
+    def load_files(self) -> Dict[str, CacheEntry]:
+        """All snapshotted upstream files as (stale) cache entries"""
+        entries: Dict[str, CacheEntry] = {}
+        if not self.directory.is_dir():
+            return entries
+        for path in self.directory.glob("*" + FILE_SUFFIX):
+            try:
+                header, content = _read(path)
+                entries[header["filename"]] = _cache_entry(header, content)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable snapshot {path.name}: {str(e)}")
+        return entries
+
+    def load_file(self, filename: str) -> Optional[CacheEntry]:
+        """One snapshotted upstream file as a (stale) cache entry"""
+        path = self._path(filename, FILE_SUFFIX)
+        try:
+            return _cache_entry(*_read(path))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot {path.name}: {str(e)}")
+            return None
+
+    def file_header(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Header (etag, digest, version, kind) of a snapshotted file without its content"""
+        path = self._path(filename, FILE_SUFFIX)
+        try:
+            with open(path, "rb") as f:
+                return _read_header(f, path.name)
+        except FileNotFoundError:
+            return None
+
+    def read_file(self, filename: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """Header and raw bytes of one snapshotted file"""
+        try:
+            return _read(self._path(filename, FILE_SUFFIX))
+        except FileNotFoundError:
+            return None
+
+    def published_files(self) -> Dict[str, str]:
+        """Filename -> kind of every snapshotted file, read from the headers only"""
+        files: Dict[str, str] = {}
+        if not self.directory.is_dir():
+            return files
+        for path in self.directory.glob("*" + FILE_SUFFIX):
+            try:
+                with open(path, "rb") as f:
+                    header = _read_header(f, path.name)
+                files[header["filename"]] = header["kind"]
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable snapshot {path.name}: {str(e)}")
+        return files
+
+    def load_store(self, key: str, digest: str) -> Optional[Tuple[ExperimentStore, int]]:
+        """The pickled store for key if it was built from the given digest"""
+        path = self._path(key, STORE_SUFFIX)
+        if not path.is_file():
+            return None
+        try:
+            header, payload = _read(
+                path, lambda header: header["digest"] == digest and header.get("format") == STORE_FORMAT
+            )
+            if payload is None:
+                return None
+            return pickle.loads(payload), header["size"]
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable snapshot {path.name}: {str(e)}")
+            return None
@@ -0,0 +1,367 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Container, Dict, Iterable, List, Optional, Set, Union
+
+from metrics import DATASET_BYTES, DATASET_EXPERIMENTS, INDEX_BUILD_DURATION
+from models import Experiment
+from records import ExperimentRecord
+from search import TextIndex, experiment_document, fold
+from suggest import SuggestIndex
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(value: str) -> str:
+    return value.lower()
+
+
+def slugify(text: str) -> str:
+    """URL-safe slug, e.g. 'Wärme & Licht!' -> 'waerme-licht'"""
+    return _SLUG_RE.sub("-", fold(text)).strip("-")
+
+
+def title_slug(title: str) -> str:
+    return slugify(title) or "experiment"
+
+
+def experiment_id(exp: Experiment, taken: Container[str]) -> str:
+    """Stable ID from the title and facets, e.g. 'mechanik-experimente-3f2a9c1b'
+
+    The short hash of title and facets is always appended, so an ID does not
+    change when an experiment with the same title slug is added, removed or
+    moved. Only exact duplicates of title and facets are numbered in order.
+    """
+    key = "\x00".join((exp.title, exp.subject, exp.gradeLevel, exp.schoolType))
+    candidate = f"{title_slug(exp.title)}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+    suffix = 2
+    unique = candidate
+    while unique in taken:
+        unique = f"{candidate}-{suffix}"
+        suffix += 1
+    return unique
+
+
+def experiment_hash(exp: Experiment) -> str:
+    """Content hash of one experiment, used to detect changes between versions"""
+    encoded = json.dumps(exp.model_dump(), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+# Bump when the pickled layout of ExperimentStore changes, so old snapshots are rebuilt
+STORE_FORMAT = 8
+
+# Fields of the lightweight listing used by list and category views
+SUMMARY_FIELDS = ("id", "title", "shortDescription", "subject", "gradeLevel", "schoolType")
+
+# Filter fields and whether they are compared case-insensitively
+FILTER_FIELDS = {
+    "subject": True,
+    "gradeLevel": False,
+    "schoolType": True,
+}
+
+
+def to_bitmap(positions: Iterable[int], size: int) -> int:
+    """Set of positions as an int with one bit per experiment"""
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+def grade_order(grade: str) -> float:
+    # Numeric grades in order, anything else last
+    return int(grade) if grade.isdigit() else float('inf')
+
+
+class ExperimentStore:
+    """Validated experiments of one dataset version with prebuilt filter indexes
+
+    The raw JSON is validated into Experiment models exactly once and kept
+    as compact ExperimentRecords (interned facets, kept as encoded JSON). Filter
+    values are normalized up front and mapped to the positions of matching
+    experiments, so a filtered search is a set intersection. Free text goes
+    through a ranked TextIndex built at the same time. Every experiment gets
+    a stable ID; IDs and titles are kept in hash indexes for direct lookup,
+    and each ID maps to a content hash for delta sync. Facet counts come from
+    per-value bitmaps, so they cost a few big-int ANDs instead of a scan.
+    Autocomplete uses a SuggestIndex over titles, subjects and the words of
+    titles and short descriptions.
+    """
+
+    def __init__(
+        self, raw: Union[bytes, Iterable[Dict[str, Any]]], digest: str = "", version: int = 0, source: str = ""
+    ):
+        self.source = source
+        self.digest = digest
+        self.version = version
+        if isinstance(raw, (bytes, str)):
+            raw = json.loads(raw)
+        elif not isinstance(raw, list):
+            raw = list(raw)
+        self.experiments: List[ExperimentRecord] = []
+        self.indexes: Dict[str, Dict[str, Set[int]]] = {field: {} for field in FILTER_FIELDS}
+        # Display value for each index key (the first spelling seen)
+        self.labels: Dict[str, Dict[str, str]] = {field: {} for field in FILTER_FIELDS}
+        self.by_id: Dict[str, int] = {}
+        self.by_title: Dict[str, int] = {}
+        self.hashes: Dict[str, str] = {}
+        documents = []
+
+        for position, exp in enumerate(Experiment(**data) for data in raw):
+            if not exp.id or exp.id in self.by_id:
+                exp.id = experiment_id(exp, self.by_id)
+            self.by_id[exp.id] = position
+            self.hashes[exp.id] = experiment_hash(exp)
+            # The first experiment with a title wins, as with the old linear scan
+            self.by_title.setdefault(exp.title, position)
+            for field, fold_case in FILTER_FIELDS.items():
+                value = getattr(exp, field)
+                key = normalize(value) if fold_case else value
+                self.indexes[field].setdefault(key, set()).add(position)
+                self.labels[field].setdefault(key, value)
+            documents.append(experiment_document(
+                exp.title,
+                exp.shortDescription,
+                ((step.type, step.content, step.description) for step in exp.steps),
+            ))
+            self.experiments.append(ExperimentRecord.from_model(exp))
+        self.text_index = TextIndex(documents)
+        size = len(self.experiments)
+        self.all_bits = (1 << size) - 1
+        self.bitmaps: Dict[str, Dict[str, int]] = {
+            field: {key: to_bitmap(positions, size) for key, positions in index.items()}
+            for field, index in self.indexes.items()
+        }
+        self.grades: List[str] = sorted(self.labels["gradeLevel"].values(), key=grade_order)
+        self.suggest_index = SuggestIndex(
+            titles=((exp.id, exp.title) for exp in self.experiments),
+            subjects={self.labels["subject"][key]: len(positions) for key, positions in self.indexes["subject"].items()},
+            texts=(f"{exp.title} {exp.shortDescription}" for exp in self.experiments),
+        )
+
+    def __len__(self) -> int:
+        return len(self.experiments)
+
+    @property
+    def summaries(self) -> List[Dict[str, str]]:
+        """Listing of all experiments without steps"""
+        return [experiment.model_dump(SUMMARY_FIELDS) for experiment in self.experiments]
+
+    @property
+    def dataset_version(self) -> str:
+        """Content-based version, the same in every process serving this dataset"""
+        return self.digest[:16]
+
+    def filter_positions(
+        self,
+        subject: Optional[str] = None,
+        gradeLevel: Optional[str] = None,
+        schoolType: Optional[str] = None,
+    ) -> Optional[Set[int]]:
+        """Positions matching all given filters, or None when no filter is set"""
+        selected: Optional[Set[int]] = None
+        for field, value in (("subject", subject), ("gradeLevel", gradeLevel), ("schoolType", schoolType)):
+            if not value:
+                continue
+            key = normalize(value) if FILTER_FIELDS[field] else value
+            matches = self.indexes[field].get(key, set())
+            selected = set(matches) if selected is None else selected & matches
+            if not selected:
+                return set()
+        return selected
+
+    def facet_counts(
+        self,
+        subject: Optional[str] = None,
+        gradeLevel: Optional[str] = None,
+        schoolType: Optional[str] = None,
+        freetext: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Result counts per filter value, given the other active filters
+
+        Each field is counted with its own filter left out, so a count is the
+        number of results selecting that value would give. Values without
+        results are included with a count of 0.
+        """
+        filters = {"subject": subject, "gradeLevel": gradeLevel, "schoolType": schoolType}
+        base = self.all_bits
+        if freetext:
+            base = to_bitmap(self.text_index.scores(freetext), len(self.experiments))
+        selected = {}
+        for field, value in filters.items():
+            if value:
+                key = normalize(value) if FILTER_FIELDS[field] else value
+                selected[field] = self.bitmaps[field].get(key, 0)
+
+        facets: Dict[str, List[Dict[str, Any]]] = {}
+        for field, bitmaps in self.bitmaps.items():
+            others = base
+            for other, bits in selected.items():
+                if other != field:
+                    others &= bits
+            counts = [
+                {"value": self.labels[field][key], "count": (bits & others).bit_count()}
+                for key, bits in bitmaps.items()
+            ]
+            order = grade_order if field == "gradeLevel" else normalize
+            facets[field] = sorted(counts, key=lambda item: order(item["value"]))
+
+        total = base
+        for bits in selected.values():
+            total &= bits
+        return {"total": total.bit_count(), "facets": facets}
+
+    def search_positions(
+        self,
+        subject: Optional[str] = None,
+        gradeLevel: Optional[str] = None,
+        schoolType: Optional[str] = None,
+        freetext: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[int]:
+        """Positions of matching experiments; with freetext they are ranked by relevance"""
+        selected = self.filter_positions(subject, gradeLevel, schoolType)
+
+        if freetext:
+            ranked = self.text_index.search(freetext, candidates=selected, limit=limit, offset=offset)
+            return [i for i, _ in ranked]
+
+        positions = range(len(self.experiments)) if selected is None else sorted(selected)
+        end = None if limit is None else offset + limit
+        return list(positions[offset:end])
+
+    def search(self, *args, **kwargs) -> List[ExperimentRecord]:
+        """Like search_positions, but returns the experiments"""
+        return [self.experiments[i] for i in self.search_positions(*args, **kwargs)]
+
+    def project(self, position: int, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """JSON-ready dict of one experiment, limited to the given fields"""
+        return self.experiments[position].model_dump(fields)
+
+    def encode(self, positions: Iterable[int]) -> bytes:
+        """JSON array of the full experiments at positions, joined from their encoded form"""
+        return b"[" + b",".join([self.experiments[position].encoded for position in positions]) + b"]"
+
+
+class StoreRegistry:
+    """Experiment stores per dataset file, built lazily and evicted LRU
+
+    Memory use of a store is estimated from the size of its source JSON
+    times an overhead factor for models and indexes. When the estimate for
+    all stores exceeds the budget, the least recently used ones are dropped;
+    the store just requested is always kept.
+
+    The per-experiment hashes of the last `history` versions of each dataset
+    are kept (independently of eviction) to answer delta sync requests.
+    on_evict is called with the key of every evicted store, so data derived
+    from it elsewhere (e.g. encoded responses) can be dropped as well.
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int = 256 * 1024 * 1024,
+        overhead: float = 6.0,
+        history: int = 8,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.budget_bytes = budget_bytes
+        self.overhead = overhead
+        self.history = history
+        self.on_evict = on_evict
+        self._stores: "OrderedDict[str, ExperimentStore]" = OrderedDict()
+        self._costs: Dict[str, int] = {}
+        self._versions: Dict[str, "OrderedDict[str, Dict[str, str]]"] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._stores
+
+    def __len__(self) -> int:
+        return len(self._stores)
+
+    @property
+    def estimated_bytes(self) -> int:
+        return sum(self._costs.values())
+
+    def peek(self, key: str) -> Optional[ExperimentStore]:
+        return self._stores.get(key)
+
+    def lookup(self, key: str, digest: str) -> Optional[ExperimentStore]:
+        """The store for key if it holds this dataset version, marked as recently used"""
+        store = self._stores.get(key)
+        if store is None or store.digest != digest:
+            return None
+        self._stores.move_to_end(key)
+        return store
+
+    def build(self, key: str, raw: Iterable[Dict[str, Any]], digest: str, version: int = 0) -> ExperimentStore:
+        """Validate and index a dataset version without registering it, so it can run in a thread"""
+        started = time.perf_counter()
+        store = ExperimentStore(raw, digest=digest, version=version, source=key)
+        INDEX_BUILD_DURATION.observe(time.perf_counter() - started, dataset=key)
+        return store
+
+    def get(self, key: str, raw: Iterable[Dict[str, Any]], digest: str, version: int = 0, size: int = 0) -> ExperimentStore:
+        """Return the store for key, rebuilding it when the digest changed"""
+        store = self.lookup(key, digest)
+        if store is None:
+            store = self.build(key, raw, digest, version)
+            self.seed(key, store, size)
+        return store
+
+    def seed(self, key: str, store: ExperimentStore, size: int = 0):
+        """Insert a prebuilt store (e.g. from a snapshot), evicting others over budget"""
+        store.source = key
+        self._track(key, store, size)
+        self._remember(key, store)
+        self._stores[key] = store
+        self._stores.move_to_end(key)
+        self._costs[key] = int(size * self.overhead)
+        self._evict()
+
+    def _evict(self):
+        # The most recently used store is kept even if it alone exceeds the budget
+        while self.estimated_bytes > self.budget_bytes and len(self._stores) > 1:
+            evicted, _ = self._stores.popitem(last=False)
+            del self._costs[evicted]
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+    def _track(self, key: str, store: ExperimentStore, size: int):
+        DATASET_EXPERIMENTS.set(len(store), dataset=key)
+        DATASET_BYTES.set(size, dataset=key)
+
+    def _remember(self, key: str, store: ExperimentStore):
+        versions = self._versions.setdefault(key, OrderedDict())
+        versions[store.dataset_version] = store.hashes
+        versions.move_to_end(store.dataset_version)
+        while len(versions) > self.history:
+            versions.popitem(last=False)
+
+    def changes(self, key: str, store: ExperimentStore, since: str) -> Optional[Dict[str, list]]:
+        """Positions added and modified in store since a version, plus removed IDs
+
+        Returns None when the version is unknown or too old to compute a delta.
+        """
+        previous = self._versions.get(key, {}).get(since)
+        if previous is None:
+            return None
+        added: List[int] = []
+        modified: List[int] = []
+        for experiment_id, position in store.by_id.items():
+            old_hash = previous.get(experiment_id)
+            if old_hash is None:
+                added.append(position)
+            elif old_hash != store.hashes[experiment_id]:
+                modified.append(position)
+        removed = [experiment_id for experiment_id in previous if experiment_id not in store.by_id]
+        return {"added": sorted(added), "modified": sorted(modified), "removed": removed}
+
+    def clear(self):
+        self._stores.clear()
+        self._costs.clear()
+        self._versions.clear()
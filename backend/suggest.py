@@ -0,0 +1,194 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from search import tokenize
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# Common words that are never suggested on their own
+STOPWORDS = frozenset(
+    "aber alle auch dann dass denn dies diese dieser dieses eine einem einen einer eines "
+    "etwas fuer ihre ihren kann mehr nach nicht oder sehr sich sind ueber unter viel warum "
+    "weil welche welcher welches wenn werden wird wieso wie zwei".split()
+)
+TERM_MIN_LENGTH = 4
+
+# Suggestions kept per trie node, and so the most a query can return
+NODE_TOP_K = 16
+
+# Edits allowed for a query word of at least this length, longest first
+FUZZY_EDITS = ((8, 2), (4, 1))
+
+KIND_ORDER = {"subject": 0, "title": 1, "term": 2}
+
+# Keys of a trie node besides its children (one letter or digit each): the best
+# suggestions below the node, and all suggestions with a word ending at it
+_TOP = ""
+_WORD = " "
+
+
+def max_edits(word: str) -> int:
+    for length, edits in FUZZY_EDITS:
+        if len(word) >= length:
+            return edits
+    return 0
+
+
+class SuggestIndex:
+    """Prefix trie over titles, subjects and key terms for search-as-you-type
+
+    Every word of a suggestion is a key in the trie, so "entd" completes
+    "Magnetismus entdecken". Suggestions are numbered best first and each
+    node keeps the first NODE_TOP_K numbers below it, so completing a prefix
+    is a walk of len(prefix) steps. Words typed before the last one must
+    appear in a suggestion as they are. When that finds too little, the trie is
+    searched again for prefixes within a few edits of the query (insertions,
+    deletions, substitutions and swapped neighbours, as in "Magnetsimus").
+    The first letter has to match, which keeps that walk small.
+    """
+
+    def __init__(self, titles: Iterable[Tuple[str, str]], subjects: Dict[str, int], texts: Iterable[str]):
+        """Titles are (id, title); subjects map to their experiment counts; words of texts become terms"""
+        # (rank key, text, kind, id)
+        candidates: List[Tuple[Tuple, str, str, Optional[str]]] = []
+        taken = set()
+        for subject, count in subjects.items():
+            taken.add(" ".join(tokenize(subject)))
+            candidates.append(((-count, KIND_ORDER["subject"], subject.lower()), subject, "subject", None))
+        for experiment_id, title in titles:
+            taken.add(" ".join(tokenize(title)))
+            candidates.append(((-1, KIND_ORDER["title"], title.lower()), title, "title", experiment_id))
+
+        # Term -> (first spelling seen, number of texts containing it)
+        terms: Dict[str, List] = {}
+        for text in texts:
+            seen = set()
+            for word in _WORD_RE.findall(text):
+                key = "".join(tokenize(word))
+                if len(key) < TERM_MIN_LENGTH or key in STOPWORDS or key.isdigit() or key in seen:
+                    continue
+                seen.add(key)
+                term = terms.setdefault(key, [word, 0])
+                term[1] += 1
+        for key, (word, count) in terms.items():
+            if key not in taken:
+                candidates.append(((-count, KIND_ORDER["term"], key), word, "term", None))
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        self.suggestions: List[Tuple[str, str, Optional[str]]] = [
+            (text, kind, experiment_id) for _, text, kind, experiment_id in candidates
+        ]
+        self.words: List[Tuple[str, ...]] = []
+        self.root: Dict[str, Any] = {_TOP: []}
+        for number, (text, _, _) in enumerate(self.suggestions):
+            words = tuple(tokenize(text))
+            self.words.append(words)
+            for word in words:
+                self._insert(word, number)
+
+    def _insert(self, word: str, number: int):
+        # Numbers arrive in ascending order, so each node's list stays sorted best first
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {_TOP: []})
+            top = node[_TOP]
+            if len(top) < NODE_TOP_K and (not top or top[-1] != number):
+                top.append(number)
+        postings = node.setdefault(_WORD, [])
+        if not postings or postings[-1] != number:
+            postings.append(number)
+
+    def _node(self, prefix: str) -> Optional[Dict[str, Any]]:
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _containing(self, words: List[str]) -> Set[int]:
+        """Numbers of the suggestions containing all of the given words"""
+        postings = []
+        for word in words:
+            node = self._node(word)
+            if node is None or _WORD not in node:
+                return set()
+            postings.append(node[_WORD])
+        postings.sort(key=len)
+        numbers = set(postings[0])
+        for other in postings[1:]:
+            numbers.intersection_update(other)
+        return numbers
+
+    def _fuzzy(self, prefix: str, edits: int) -> Dict[str, Tuple[int, Dict[str, Any]]]:
+        """Trie prefixes within `edits` of prefix, with their distance and node"""
+        found: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        first = self.root.get(prefix[0])
+        if first is None:
+            return found
+        columns = len(prefix) + 1
+        # Optimal string alignment distance, one row per trie level
+        stack = [(first, prefix[0], list(range(columns)), None)]
+        while stack:
+            node, path, above, above2 = stack.pop()
+            char = path[-1]
+            previous_char = path[-2] if len(path) > 1 else ""
+            row = [above[0] + 1]
+            for j in range(1, columns):
+                value = min(row[j - 1] + 1, above[j] + 1, above[j - 1] + (prefix[j - 1] != char))
+                if above2 is not None and j > 1 and prefix[j - 1] == previous_char and prefix[j - 2] == char:
+                    value = min(value, above2[j - 2] + 1)
+                row.append(value)
+            if row[-1] <= edits:
+                found[path] = (row[-1], node)
+            if min(row) <= edits:
+                for child_char, child in node.items():
+                    if child_char != _TOP and child_char != _WORD:
+                        stack.append((child, path + child_char, row, above))
+        return found
+
+    def suggest(self, query: str, limit: int = 8) -> List[Dict[str, str]]:
+        """Best completions of the last word of query, containing the words before it"""
+        words = tokenize(query)
+        if not words:
+            return []
+        *complete, prefix = words
+        edits = max_edits(prefix)
+        if complete:
+            # Few enough candidates to check each of their words
+            required = sorted(self._containing(complete))
+            distances = {}
+            for number in required:
+                if any(word.startswith(prefix) for word in self.words[number]):
+                    distances[number] = 0
+                    if len(distances) == limit:
+                        break
+            if len(distances) < limit and edits and required:
+                matches = self._fuzzy(prefix, edits)
+                lengths = range(max(1, len(prefix) - edits), len(prefix) + edits + 1)
+                for number in required:
+                    if number in distances:
+                        continue
+                    found = [
+                        matches[word[:length]][0]
+                        for word in self.words[number] for length in lengths if word[:length] in matches
+                    ]
+                    if found:
+                        distances[number] = min(found)
+        else:
+            node = self._node(prefix)
+            distances = {number: 0 for number in node[_TOP]} if node is not None else {}
+            if len(distances) < limit and edits:
+                for distance, match in self._fuzzy(prefix, edits).values():
+                    for number in match[_TOP]:
+                        if distance < distances.get(number, edits + 1):
+                            distances[number] = distance
+
+        results = []
+        for number in sorted(distances, key=lambda number: (distances[number], number))[:limit]:
+            text, kind, experiment_id = self.suggestions[number]
+            suggestion = {"text": text, "type": kind}
+            if experiment_id is not None:
+                suggestion["id"] = experiment_id
+            results.append(suggestion)
+        return results
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from upstream import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_TRANSLATE_URL = "https://translate.googleapis.com/translate_a/single"
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+
+def translation_key(text: str, source: str, target: str) -> str:
+    return hashlib.sha256(f"{source}\x00{target}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class Translator:
+    """Interface for translation backends"""
+
+    name = "base"
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class StubTranslator(Translator):
+    """Offline translator for tests and local development: tags the text with the target language"""
+
+    name = "stub"
+
+    def __init__(self):
+        self.calls: List[str] = []
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        self.calls.append(text)
+        return f"[{target}] {text}"
+
+
+class GoogleTranslator(Translator):
+    """The public Google endpoint the app used to call from the device"""
+
+    name = "google"
+
+    def __init__(self, url: str = GOOGLE_TRANSLATE_URL, timeout: float = 15.0):
+        self.url = url
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def translate(self, text: str, source: str, target: str) -> str:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        response = await self._client.post(
+            self.url,
+            params={"client": "gtx", "sl": source, "tl": target, "dt": "t"},
+            data={"q": text},
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if not isinstance(payload, list) or not isinstance(payload[0], list):
+            raise ValueError("Unexpected translation response")
+        return "".join(
+            entry[0] for entry in payload[0] if isinstance(entry, list) and isinstance(entry[0], str)
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+TRANSLATORS = {
+    StubTranslator.name: StubTranslator,
+    GoogleTranslator.name: GoogleTranslator,
+}
+
+
+class TranslationCache:
+    """Persistent translations in SQLite, keyed by the hash of text and languages"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " key TEXT PRIMARY KEY,"
+                " target TEXT NOT NULL,"
+                " translation TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(keys)
+        found: Dict[str, str] = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({placeholders})", chunk
+                )
+                found.update(rows)
+        return found
+
+    def put_many(self, items: Dict[str, str], target: str):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO translations (key, target, translation, created_at) VALUES (?, ?, ?, ?)",
+                [(key, target, translation, now) for key, translation in items.items()],
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class TranslationService:
+    """Batch translation through a shared cache; only misses reach the translator
+
+    In offline mode the translator is never called and misses are returned
+    untranslated, as if the translation had failed.
+    """
+
+    def __init__(self, cache: TranslationCache, translator: Translator, concurrency: int = 4, offline: bool = False):
+        self.cache = cache
+        self.translator = translator
+        self.concurrency = concurrency
+        self.offline = offline
+        self.flights = SingleFlight()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _limit(self) -> asyncio.Semaphore:
+        """Semaphore bounding translator calls across all concurrent requests"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def translate(self, texts: List[str], target: str, source: str = "auto") -> Dict[str, object]:
+        """Translate texts in order; returns the translations plus hit/miss counts"""
+        unique = list(dict.fromkeys(text for text in texts if text.strip()))
+        keys = {text: translation_key(text, source, target) for text in unique}
+        cached = await run_in_threadpool(self.cache.get_many, keys.values())
+
+        misses = [text for text in unique if keys[text] not in cached]
+        translated: Dict[str, str] = {}
+        if misses and not self.offline:
+            semaphore = self._limit()
+
+            async def translate_one(text: str):
+                async with semaphore:
+                    return await self.translator.translate(text, source, target)
+
+            results = await asyncio.gather(
+                *[self.flights.do(keys[text], lambda text=text: translate_one(text)) for text in misses],
+                return_exceptions=True,
+            )
+            for text, result in zip(misses, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Translation to {target} failed: {str(result)}")
+                    continue
+                translated[keys[text]] = result
+            await run_in_threadpool(self.cache.put_many, translated, target)
+
+        lookup = {**cached, **translated}
+        return {
+            # Untranslatable texts (blank or failed) are returned unchanged
+            "translations": [lookup.get(translation_key(text, source, target), text) for text in texts],
+            "cached": len(unique) - len(misses),
+            "translated": len(translated),
+            "failed": len(misses) - len(translated),
+        }
+
+    async def aclose(self):
+        await self.translator.aclose()
+        self.cache.close()
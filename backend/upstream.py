@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from metrics import UPSTREAM_BYTES, UPSTREAM_CIRCUIT, UPSTREAM_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Timeouts for talking to GitLab raw (seconds)
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+# Consecutive failures (errors, timeouts, 5xx) that open the circuit, and how long it stays open
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one in-flight task"""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Return the running task for key, starting fn() if there is none"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Tasks are bound to the loop that created them
+            self._tasks = {}
+            self._loop = loop
+
+        task = self._tasks.get(key)
+        if task is None:
+            task = loop.create_task(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        return task
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Shield so a cancelled waiter does not cancel the shared fetch
+        return await asyncio.shield(self.start(key, fn))
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved if nobody is waiting any more
+            task.exception()
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._tasks
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of contacting upstream while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Upstream unavailable, circuit open (retry in {retry_after:.0f}s)")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops sending requests to an upstream that keeps failing
+
+    Closed, requests pass and failure_threshold consecutive failures open
+    the circuit. Open, requests fail at once with CircuitOpenError instead
+    of waiting for a timeout. After reset_timeout seconds it is half-open:
+    one probe request at a time is let through, its success closes the
+    circuit and its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    # Values of the state gauge
+    _GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next request may be tried"""
+        if self.state == self.CLOSED:
+            return 0.0
+        return max(1.0, self.opened_at + self.reset_timeout - self.clock())
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN:
+            if self.clock() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(self.retry_after)
+            self._set_state(self.HALF_OPEN)
+        if self._probing:
+            raise CircuitOpenError(self.retry_after)
+        self._probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            logger.info("Upstream recovered, closing circuit")
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(
+                    f"Opening upstream circuit after {self.failures} failures, "
+                    f"retrying in {self.reset_timeout:.0f}s"
+                )
+            self.opened_at = self.clock()
+            self._set_state(self.OPEN)
+
+    def release(self):
+        """Give up a request without a result (e.g. when it was cancelled)"""
+        self._probing = False
+
+    def _set_state(self, state: str):
+        self.state = state
+        UPSTREAM_CIRCUIT.set(self._GAUGE[state])
+
+
+class UpstreamClient:
+    """Async client for the GitLab data repository with a pooled connection"""
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+        limits: httpx.Limits = DEFAULT_LIMITS,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.limits = limits
+        self.breaker = breaker or CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # Pooled connections cannot be shared across event loops
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def get(
+        self, filename: str, headers: Optional[Dict[str, str]] = None, label: Optional[str] = None
+    ) -> httpx.Response:
+        """GET a file below the base URL; 304 responses are returned, other errors raise
+
+        While the circuit breaker is open this raises CircuitOpenError right
+        away. label replaces the filename in metrics, to keep their
+        cardinality bounded.
+        """
+        name = label or filename
+        self.breaker.before_request()
+        started = time.perf_counter()
+        try:
+            response = await self._get_client().get(f"/{filename}", headers=headers)
+        except httpx.HTTPError:
+            UPSTREAM_DURATION.observe(time.perf_counter() - started, file=name, status="error")
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        UPSTREAM_DURATION.observe(time.perf_counter() - started, file=name, status=str(response.status_code))
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        UPSTREAM_BYTES.inc(len(response.content), file=name)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    async def aclose(self):
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except RuntimeError:
+                # The loop the client was created on is already gone
+                pass
+            self._client = None
+            self._client_loop = None
@@ -0,0 +1,289 @@
+"""Throughput and latency of the backend under concurrent load, against a local upstream
+
+Starts the app with uvicorn in a subprocess for each catalog size, pointed
+at a local stand-in for GitLab, and measures:
+
+  * cold start: time until /api/healthz and /api/readyz answer
+  * the first (cold) request and concurrent warm load per scenario,
+    reported as throughput and p50/p95/p99 latency
+  * peak RSS of the server process
+
+    python benchmarks/bench_load.py --sizes 100,10000,100000
+    python benchmarks/bench_load.py --save-baseline      # store benchmarks/baseline.json
+    python benchmarks/bench_load.py --compare            # exit 1 on a regression
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+import httpx
+
+from support import BACKEND_DIR, GRADES, SUBJECTS, WORDS, StubUpstream, synthetic_catalog, upstream_files
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# Metrics compared against the baseline and whether higher is better
+COMPARED = {"rps": True, "p95_ms": False, "ready_s": False, "peak_rss_mb": False}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """Peak resident set size of a process (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def typo(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def scenarios(catalog, seed: int) -> Dict[str, List[str]]:
+    """Request paths per scenario; each is cycled through during the load phase"""
+    rng = random.Random(seed)
+    titles = rng.sample([exp["title"] for exp in catalog], min(len(catalog), 200))
+    return {
+        "list": ["/api/experiments"],
+        "search_filter": [
+            f"/api/experiments/search?subject={quote(rng.choice(SUBJECTS))}&gradeLevel={rng.choice(GRADES)}"
+            for _ in range(50)
+        ],
+        "search_freetext": [
+            f"/api/experiments/search?freetext={quote(' '.join(rng.sample(WORDS, 2)))}&limit=20"
+            for _ in range(50)
+        ],
+        "title_lookup": [f"/api/experiments/{quote(title, safe='')}" for title in titles],
+        # Keystrokes: growing prefixes, every other one with two letters swapped
+        "suggest": [
+            f"/api/experiments/suggest?q={quote(typo(word[:length], rng) if length % 2 else word[:length])}"
+            for word in rng.sample(WORDS, 10) for length in range(1, len(word) + 1)
+        ],
+    }
+
+
+async def wait_until_ok(client: httpx.AsyncClient, path: str, process: subprocess.Popen, timeout: float) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with {process.returncode}")
+        try:
+            if (await client.get(path)).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.02)
+    raise TimeoutError(f"{path} did not become ready within {timeout}s")
+
+
+async def load(client: httpx.AsyncClient, paths: List[str], requests: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            path = paths[i % len(paths)]
+            started = time.perf_counter()
+            # Read the raw bytes so client-side decompression is not measured
+            async with client.stream("GET", path) as response:
+                async for _chunk in response.aiter_raw():
+                    pass
+                assert response.status_code == 200, (path, response.status_code)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+    }
+
+
+async def run_size(size: int, args) -> Dict:
+    catalog = synthetic_catalog(size, seed=args.seed, steps=args.steps)
+    stub = StubUpstream(upstream_files(catalog))
+    port = free_port()
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(
+            os.environ,
+            GITLAB_BASE_URL=stub.url,
+            SNAPSHOT_DIR="",
+            MEDIA_CACHE_DIR=str(Path(data_dir) / "media"),
+            TRANSLATION_CACHE_PATH=str(Path(data_dir) / "translations.sqlite3"),
+            TRANSLATOR="stub",
+        )
+        command = [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"]
+        spawned = time.perf_counter()
+        process = subprocess.Popen(
+            command, cwd=str(BACKEND_DIR), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120.0) as client:
+                healthy = await wait_until_ok(client, "/api/healthz", process, args.timeout)
+                ready = await wait_until_ok(client, "/api/readyz", process, args.timeout)
+                startup = (await client.get("/api/readyz")).json()["startup"]
+                result = {
+                    "experiments": size,
+                    "dataset_mb": round(len(stub.files["_experiments.json"]) / 1e6, 2),
+                    "healthy_s": round(healthy - spawned, 3),
+                    "ready_s": round(ready - spawned, 3),
+                    "warmup_s": startup.get("warmup", {}).get("total"),
+                    "scenarios": {},
+                }
+                for name, paths in scenarios(catalog, args.seed).items():
+                    started = time.perf_counter()
+                    assert (await client.get(paths[0])).status_code == 200
+                    cold_ms = round((time.perf_counter() - started) * 1000, 2)
+                    requests = args.requests if name != "list" else max(args.concurrency, args.requests // 10)
+                    warm = await load(client, paths, requests, args.concurrency)
+                    result["scenarios"][name] = {"cold_ms": cold_ms, **warm}
+                result["peak_rss_mb"] = peak_rss_mb(process.pid)
+                result["upstream_requests"] = stub.hits
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+            stub.stop()
+    return result
+
+
+def print_result(result: Dict):
+    rss = result["peak_rss_mb"]
+    print(
+        f"\n{result['experiments']} experiments ({result['dataset_mb']} MB): "
+        f"healthy {result['healthy_s']}s, ready {result['ready_s']}s, "
+        f"peak RSS {'n/a' if rss is None else f'{rss:.0f} MB'}, upstream requests {result['upstream_requests']}"
+    )
+    print(f"  {'scenario':<16} {'cold ms':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in result["scenarios"].items():
+        print(
+            f"  {name:<16} {stats['cold_ms']:>9} {stats['rps']:>9} "
+            f"{stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}"
+        )
+
+
+def flatten(result: Dict) -> Dict[str, float]:
+    """Compared metrics keyed by 'size/scenario/metric'"""
+    size = result["experiments"]
+    values = {f"{size}/ready_s": result["ready_s"]}
+    if result["peak_rss_mb"] is not None:
+        values[f"{size}/peak_rss_mb"] = result["peak_rss_mb"]
+    for name, stats in result["scenarios"].items():
+        for metric in ("rps", "p95_ms"):
+            values[f"{size}/{name}/{metric}"] = stats[metric]
+    return values
+
+
+def baseline_metrics(baseline: Dict) -> Dict[str, float]:
+    expected = {}
+    for result in baseline["results"]:
+        expected.update(flatten(result))
+    return expected
+
+
+def unchecked(results: List[Dict], baseline: Dict) -> List[str]:
+    """Metrics of scenarios and sizes that the baseline has no value for"""
+    expected = baseline_metrics(baseline)
+    return [key for result in results for key in flatten(result) if key not in expected]
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """Descriptions of all metrics that are worse than the baseline by more than tolerance"""
+    expected = baseline_metrics(baseline)
+    regressions = []
+    for result in results:
+        for key, value in flatten(result).items():
+            if key not in expected:
+                continue
+            reference = expected[key]
+            higher_is_better = COMPARED[key.rsplit("/", 1)[1]]
+            change = (value - reference) / reference if reference else 0.0
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{key}: {value} vs baseline {reference} ({change:+.0%})")
+    return regressions
+
+
+async def main(args):
+    results = []
+    for size in args.sizes:
+        result = await run_size(size, args)
+        print_result(result)
+        results.append(result)
+
+    report = {
+        "python": sys.version.split()[0],
+        "steps": args.steps,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nBaseline saved to {BASELINE_PATH}")
+    if args.compare:
+        baseline = json.loads(BASELINE_PATH.read_text())
+        for setting in ("steps", "requests", "concurrency"):
+            if baseline.get(setting) != report[setting]:
+                print(f"\nWarning: baseline was recorded with {setting}={baseline.get(setting)}, not {report[setting]}")
+        missing = unchecked(results, baseline)
+        if missing:
+            print(f"\nWarning: not in the baseline, so not checked (re-record with --save-baseline): {', '.join(missing)}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {BASELINE_PATH.name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")],
+                        default=[100, 10000, 100000], help="comma-separated catalog sizes")
+    parser.add_argument("--steps", type=int, default=6, help="steps per synthetic experiment")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario (list: a tenth)")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent connections")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for readiness")
+    parser.add_argument("--output", help="write the full results as JSON")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store results as {BASELINE_PATH.name}")
+    parser.add_argument("--compare", action="store_true", help="fail if worse than the stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    asyncio.run(main(parser.parse_args()))
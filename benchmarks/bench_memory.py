@@ -0,0 +1,182 @@
+"""Memory held per experiment by the upstream cache and the experiment store
+
+Loads a synthetic catalog the way the server does (the dataset file through
+UpstreamCache, then ExperimentStore from the cached value) and reports the
+bytes per experiment of each part: the cached file, the experiment records,
+filter indexes, lookups, the text and suggest indexes, and the pickled
+store. Objects shared between parts are counted once, for the first part.
+
+The legacy representation is the one before ExperimentRecord: the parsed
+JSON in the cache, one pydantic Experiment per experiment and a stored
+summary listing. Its indexes are the same, so they are measured once and
+only the cache, records and summaries are rebuilt the old way.
+
+    python benchmarks/bench_memory.py --sizes 1000,20000
+    python benchmarks/bench_memory.py --representations records
+    python benchmarks/bench_memory.py --output memory.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import pickle
+import sys
+import time
+import types
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+import httpx
+
+from support import synthetic_catalog, upstream_files
+
+from cache import UpstreamCache
+from models import Experiment
+from server import DEFAULT_DATASET, UPSTREAM_FILES
+from store import SUMMARY_FIELDS, ExperimentStore
+
+REPRESENTATIONS = ("legacy", "records")
+
+# Store attributes per reported part; anything else is counted as "other"
+PARTS = {
+    "records": ("experiments",),
+    # Stored by the legacy representation only, records derive it on demand
+    "summaries": ("summaries",),
+    "filters": ("indexes", "labels", "bitmaps", "all_bits", "grades"),
+    "lookups": ("by_id", "by_title", "hashes"),
+    "text_index": ("text_index",),
+    "suggest_index": ("suggest_index",),
+}
+
+# Shared by everything and not owned by the data
+_SKIP = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_size(obj: Any, seen: Set[int]) -> int:
+    """Size of obj and everything it references that is not in seen yet"""
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SKIP):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        stack.extend(gc.get_referents(current))
+    return size
+
+
+class FileClient:
+    """Answers every request with the given file contents"""
+
+    def __init__(self, files: Dict[str, bytes]):
+        self.files = files
+
+    async def get(self, filename, headers=None, label=None):
+        request = httpx.Request("GET", f"http://upstream/{filename}")
+        return httpx.Response(200, content=self.files[filename], request=request)
+
+
+def legacy(content: bytes, store: ExperimentStore) -> Tuple[Any, Dict[str, Any]]:
+    """Cached value and store attributes of the legacy representation
+
+    The dataset was cached parsed and the store kept validated models (with
+    the IDs the store assigned) plus the summary listing. The indexes shared
+    their strings with the parsed JSON, as they share them with the records.
+    """
+    parsed = json.loads(content)
+    experiments: List[Experiment] = []
+    for record, data in zip(store.experiments, parsed):
+        data.update((field, getattr(record, field)) for field in SUMMARY_FIELDS if field != "id")
+        exp = Experiment(**data)
+        exp.id = record.id
+        experiments.append(exp)
+    summaries = [exp.model_dump(include=set(SUMMARY_FIELDS)) for exp in experiments]
+    return parsed, {"experiments": experiments, "summaries": summaries}
+
+
+def measure(size: int, steps: int, seed: int, representation: str) -> Dict[str, Any]:
+    catalog = synthetic_catalog(size, seed=seed, steps=steps)
+    content = upstream_files(catalog)[DEFAULT_DATASET].encode("utf-8")
+    del catalog
+    gc.collect()
+
+    cache = UpstreamCache(FileClient({DEFAULT_DATASET: content}))
+    entry = asyncio.run(cache.get_entry(DEFAULT_DATASET, kind=UPSTREAM_FILES[DEFAULT_DATASET]))
+    started = time.perf_counter()
+    store = ExperimentStore(entry.value, digest=entry.digest)
+    build_s = time.perf_counter() - started
+    cached = entry.value
+    attributes = dict(vars(store))
+    if representation == "legacy":
+        cached, replaced = legacy(content, store)
+        attributes.update(replaced)
+        # Free the records, so only the legacy objects are alive
+        entry = store = None
+    gc.collect()
+
+    seen: Set[int] = set()
+    parts = {"cache": deep_size(cached, seen)}
+    remaining = dict(attributes)
+    for part, names in PARTS.items():
+        parts[part] = sum(deep_size(remaining.pop(name), seen) for name in names if name in remaining)
+    parts["other"] = sum(deep_size(value, seen) for value in remaining.values())
+    # Pickled like the store, as a dict of its attributes. Measured last: pickling
+    # caches the UTF-8 form of non-ASCII strings, which makes them larger.
+    pickled = len(pickle.dumps(attributes, protocol=pickle.HIGHEST_PROTOCOL))
+
+    return {
+        "representation": representation,
+        "experiments": size,
+        "dataset_bytes": len(content),
+        # Store build time, measured for the current representation only
+        "build_s": round(build_s, 2) if representation == "records" else None,
+        "bytes_per_experiment": {part: round(value / size) for part, value in parts.items()},
+        "store_per_experiment": round(sum(value for part, value in parts.items() if part != "cache") / size),
+        "total_per_experiment": round(sum(parts.values()) / size),
+        "pickle_per_experiment": round(pickled / size),
+        "file_per_experiment": round(len(content) / size),
+    }
+
+
+def print_results(results: List[Dict[str, Any]]):
+    """One table per catalog size with a bytes/experiment column per representation"""
+    first = results[0]
+    print(
+        f"\n{first['experiments']} experiments ({first['dataset_bytes'] / 1e6:.1f} MB file, "
+        f"{first['file_per_experiment']} B each), bytes per experiment"
+    )
+    print(f"  {'part':<16}" + "".join(f" {result['representation']:>10}" for result in results))
+    rows = [(part, [result["bytes_per_experiment"][part] for result in results]) for part in first["bytes_per_experiment"]]
+    for label, key in (("store total", "store_per_experiment"), ("total", "total_per_experiment"),
+                       ("pickled store", "pickle_per_experiment")):
+        rows.append((label, [result[key] for result in results]))
+    for label, values in rows:
+        print(f"  {label:<16}" + "".join(f" {value:>10}" for value in values))
+
+
+def main(args):
+    results = []
+    for size in args.sizes:
+        results_for_size = [measure(size, args.steps, args.seed, representation) for representation in args.representations]
+        print_results(results_for_size)
+        results += results_for_size
+    if args.output:
+        Path(args.output).write_text(json.dumps({"steps": args.steps, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")],
+                        default=[20000], help="comma-separated catalog sizes")
+    parser.add_argument("--steps", type=int, default=8, help="steps per synthetic experiment")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--representations", type=lambda value: value.split(","), default=list(REPRESENTATIONS),
+                        help=f"comma-separated, any of {', '.join(REPRESENTATIONS)}")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+    unknown = set(args.representations) - set(REPRESENTATIONS)
+    if unknown:
+        parser.error(f"unknown representations: {', '.join(sorted(unknown))}")
+    main(args)
@@ -0,0 +1,77 @@
+"""Requests/s of pre-encoded responses vs. validating through response_model
+
+    python benchmarks/bench_response_cache.py --size 1000 --requests 200
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+
+from support import StubUpstream, attach, synthetic_catalog, upstream_files
+
+
+def legacy_app(server_module) -> FastAPI:
+    """The previous /experiments implementation, for comparison"""
+    app = FastAPI()
+
+    @app.get("/api/experiments", response_model=List[server_module.Experiment])
+    async def get_experiments():
+        data = await server_module.fetch_json_data("_experiments.json")
+        return [server_module.Experiment(**exp) for exp in data]
+
+    return app
+
+
+async def measure(app, path: str, requests: int, headers=None) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(path, headers=headers)  # warm the caches
+        start = time.perf_counter()
+        for _ in range(requests):
+            # Read the raw bytes so client-side decompression is not measured
+            async with client.stream("GET", path, headers=headers) as response:
+                assert response.status_code in (200, 304), response.status_code
+                async for _chunk in response.aiter_raw():
+                    pass
+        return requests / (time.perf_counter() - start)
+
+
+async def main(size: int, requests: int):
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    stub = StubUpstream(upstream_files(synthetic_catalog(size)))
+    attach(server, stub.url)
+    try:
+        results = {
+            "response_model (before)": await measure(legacy_app(server), "/api/experiments", requests),
+            "pre-encoded identity": await measure(server.app, "/api/experiments", requests,
+                                                  {"Accept-Encoding": "identity"}),
+            "pre-encoded br": await measure(server.app, "/api/experiments", requests,
+                                            {"Accept-Encoding": "br"}),
+        }
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            etag = (await client.get("/api/experiments")).headers["ETag"]
+        results["If-None-Match -> 304"] = await measure(server.app, "/api/experiments", requests,
+                                                       {"If-None-Match": etag})
+    finally:
+        stub.stop()
+
+    baseline = results["response_model (before)"]
+    print(f"/api/experiments with {size} experiments, {requests} sequential requests")
+    for name, rate in results.items():
+        print(f"  {name:<26} {rate:10.1f} req/s  ({rate / baseline:6.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1000, help="number of experiments")
+    parser.add_argument("--requests", type=int, default=200, help="requests per variant")
+    args = parser.parse_args()
+    asyncio.run(main(args.size, args.requests))
@@ -0,0 +1,122 @@
+"""Shared helpers for the backend benchmarks: synthetic data and a local upstream"""
+
+import hashlib
+import json
+import random
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+SUBJECTS = ["Physik", "Chemie", "Biologie", "Mathematik", "Sachunterricht", "Informatik"]
+SCHOOL_TYPES = ["Gymnasium", "Realschule", "Oberschule", "Gesamtschule", "Grundschule"]
+GRADES = [str(grade) for grade in range(1, 14)]
+WORDS = (
+    "Wärme Licht Strom Magnet Wasser Luft Druck Kraft Energie Temperatur Säure Base Salz "
+    "Zucker Pflanze Zelle Schatten Spiegel Linse Schall Welle Feder Hebel Reibung Dichte "
+    "Lösung Kristall Metall Glas Papier Kerze Flamme Thermometer Waage Messbecher Becher "
+    "untersuchen beobachten messen vergleichen erhitzen abkühlen mischen notieren zeichnen"
+).split()
+
+
+def synthetic_catalog(size: int, seed: int = 42, steps: int = 8):
+    """A reproducible list of experiments shaped like _experiments.json"""
+    rng = random.Random(seed)
+    catalog = []
+    for i in range(size):
+        title = " ".join(rng.choices(WORDS, k=3)).capitalize() + f" {i}"
+        catalog.append({
+            "title": title,
+            "shortDescription": " ".join(rng.choices(WORDS, k=12)),
+            "subject": rng.choice(SUBJECTS),
+            "gradeLevel": rng.choice(GRADES),
+            "schoolType": rng.choice(SCHOOL_TYPES),
+            "steps": [
+                {"type": "text", "content": " ".join(rng.choices(WORDS, k=40)), "description": ""}
+                if j % 4 else
+                {"type": "image", "content": f"images/{i}/{j}.png", "description": "Aufbau"}
+                for j in range(steps)
+            ],
+        })
+    return catalog
+
+
+def upstream_files(catalog):
+    return {
+        "_experiments.json": json.dumps(catalog, ensure_ascii=False),
+        "subjects.json": json.dumps({"Sachsen": SUBJECTS, "Bayern": SUBJECTS[:3]}),
+        "typeOfSchoole.json": json.dumps({"Sachsen": SCHOOL_TYPES}),
+        "impressum.txt": "Alltagslabor Impressum",
+    }
+
+
+class StubUpstream:
+    """Minimal stand-in for GitLab raw with ETag support, served from memory"""
+
+    def __init__(self, files):
+        self.files = {name: body.encode("utf-8") for name, body in files.items()}
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub.hits += 1
+                data = stub.files.get(self.path.lstrip("/").split("?", 1)[0])
+                if data is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.md5(data).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def attach(server_module, url: str):
+    """Point a freshly imported server module at a local upstream"""
+    from cache import UpstreamCache
+    from responses import ResponseCache
+    from store import StoreRegistry
+    from upstream import UpstreamClient
+
+    client = UpstreamClient(url)
+    server_module.upstream = client
+    server_module._cache = UpstreamCache(
+        client,
+        default_ttl=server_module.CACHE_TTL_SECONDS,
+        ttls=server_module.CACHE_TTLS,
+        max_bytes=server_module.CACHE_MAX_BYTES,
+    )
+    server_module._stores = StoreRegistry(
+        budget_bytes=server_module.STORE_MEMORY_BUDGET, on_evict=server_module.forget_responses
+    )
+    server_module._responses = ResponseCache()
+    # Synthetic data must not end up in the real snapshot directory
+    server_module._snapshot = None
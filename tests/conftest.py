@@ -0,0 +1,126 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from tests.helpers import SAMPLE_EXPERIMENTS
+
+
+SAMPLE_FILES = {
+    "_experiments.json": json.dumps(SAMPLE_EXPERIMENTS),
+    "_experiments_eng.json": json.dumps([
+        dict(SAMPLE_EXPERIMENTS[0], title="Mechanics experiments", subject="Physics",
+             shortDescription="Forces and motion in everyday life"),
+    ]),
+    "subjects.json": json.dumps({"Sachsen": ["Physik", "Chemie"], "Bayern": ["Physik"]}),
+    "typeOfSchoole.json": json.dumps({"Sachsen": ["Gymnasium", "Oberschule"]}),
+    "impressum.txt": "Alltagslabor Impressum",
+}
+
+
+class FakeUpstream:
+    """Local stand-in for the GitLab raw endpoint"""
+
+    def __init__(self, files):
+        self.files = dict(files)
+        self.hits = Counter()
+        self.not_modified = Counter()
+        self.delay = 0.0
+        # Status to answer every request with instead of the file, e.g. 503
+        self.error_status = None
+        self._lock = threading.Lock()
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                name = self.path.lstrip("/").split("?", 1)[0]
+                with upstream._lock:
+                    upstream.hits[name] += 1
+                if upstream.delay:
+                    time.sleep(upstream.delay)
+                if upstream.error_status:
+                    self.send_response(upstream.error_status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = upstream.files.get(name)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = body.encode("utf-8") if isinstance(body, str) else body
+                etag = '"%s"' % hashlib.md5(data).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    with upstream._lock:
+                        upstream.not_modified[name] += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def fake_upstream():
+    fake = FakeUpstream(SAMPLE_FILES).start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def server(fake_upstream, monkeypatch, tmp_path):
+    """The backend module wired to the local upstream with an empty cache"""
+    import server as server_module
+    from cache import UpstreamCache
+    from media import MediaCache, MediaProxy
+    from responses import ResponseCache
+    from store import StoreRegistry
+    from upstream import UpstreamClient
+
+    client = UpstreamClient(fake_upstream.url)
+    monkeypatch.setattr(server_module, "upstream", client)
+    monkeypatch.setattr(
+        server_module,
+        "_cache",
+        UpstreamCache(client, default_ttl=server_module.CACHE_TTL_SECONDS, ttls=server_module.CACHE_TTLS),
+    )
+    monkeypatch.setattr(server_module, "_stores", StoreRegistry(on_evict=server_module.forget_responses))
+    monkeypatch.setattr(server_module, "_responses", ResponseCache())
+    monkeypatch.setattr(server_module, "_media", MediaProxy(client, MediaCache(tmp_path / "media")))
+    monkeypatch.setattr(server_module, "_ready", False)
+    monkeypatch.setattr(server_module, "_snapshot", None)
+    yield server_module
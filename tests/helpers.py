@@ -0,0 +1,69 @@
+"""Test data and helpers shared by the test modules"""
+import asyncio
+
+import httpx
+
+SAMPLE_EXPERIMENTS = [
+    {
+        "title": "Mechanik Experimente",
+        "shortDescription": "Kräfte und Bewegung im Alltag",
+        "subject": "Physik",
+        "gradeLevel": "7",
+        "schoolType": "Gymnasium",
+        "steps": [
+            {"type": "text", "content": "Wir untersuchen die Reibung einer Kiste."},
+            {"type": "image", "content": "images/kiste.png", "description": "Aufbau"},
+        ],
+    },
+    {
+        "title": "Wärme und Temperatur",
+        "shortDescription": "Wie sich Wärme in Metallen ausbreitet",
+        "subject": "Physik",
+        "gradeLevel": "8",
+        "schoolType": "Realschule",
+        "steps": [
+            {"type": "text", "content": "Erhitze den Metallstab an einem Ende."},
+        ],
+    },
+    {
+        "title": "Säuren im Haushalt",
+        "shortDescription": "Essig und Zitronensaft untersuchen",
+        "subject": "Chemie",
+        "gradeLevel": "7",
+        "schoolType": "Gymnasium",
+        "steps": [
+            {"type": "text", "content": "Gib Rotkohlsaft in die Gläser mit Essig."},
+        ],
+    },
+    {
+        "title": "Magnetismus entdecken",
+        "shortDescription": "Welche Stoffe zieht ein Magnet an?",
+        "subject": "Physik",
+        "gradeLevel": "5",
+        "schoolType": "Gesamtschule",
+        "steps": [
+            {"type": "text", "content": "Halte den Magneten an verschiedene Gegenstände."},
+        ],
+    },
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def asgi_client(app):
+    """HTTP client that calls the ASGI app in-process"""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def wait_for(predicate, timeout=5.0):
+    """Poll predicate until it holds; fails the test after timeout seconds"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
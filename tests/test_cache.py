@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+
+from cache import UpstreamCache
+from upstream import UpstreamClient
+from tests.helpers import FakeClock
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(fake_upstream, clock):
+    return UpstreamCache(UpstreamClient(fake_upstream.url), default_ttl=60, clock=clock)
+
+
+async def wait_for_refresh(cache, filename):
+    while cache.refreshing(filename):
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.anyio
+async def test_fresh_entries_are_served_without_upstream_calls(cache, fake_upstream, clock):
+    first = await cache.get("subjects.json")
+    clock.now += 30
+    second = await cache.get("subjects.json")
+
+    assert first is second
+    assert fake_upstream.hits["subjects.json"] == 1
+
+
+@pytest.mark.anyio
+async def test_expired_entry_is_revalidated_with_etag(cache, fake_upstream, clock):
+    entry = await cache.get_entry("subjects.json")
+    clock.now += 61
+
+    stale = await cache.get_entry("subjects.json")
+    assert stale is entry
+    await wait_for_refresh(cache, "subjects.json")
+
+    assert fake_upstream.not_modified["subjects.json"] == 1
+    assert cache.peek("subjects.json").version == 1
+    assert cache.is_fresh(cache.peek("subjects.json"), "subjects.json")
+
+
+@pytest.mark.anyio
+async def test_stale_copy_is_served_while_new_content_loads(cache, fake_upstream, clock):
+    await cache.get("subjects.json")
+    fake_upstream.files["subjects.json"] = json.dumps({"Berlin": ["Biologie"]})
+    fake_upstream.delay = 0.2
+    clock.now += 61
+
+    stale = await asyncio.wait_for(cache.get("subjects.json"), timeout=0.1)
+    assert "Sachsen" in stale
+
+    await wait_for_refresh(cache, "subjects.json")
+    assert await cache.get("subjects.json") == {"Berlin": ["Biologie"]}
+    assert cache.peek("subjects.json").version == 2
+
+
+@pytest.mark.anyio
+async def test_failed_refresh_keeps_serving_stale_copy(cache, fake_upstream, clock):
+    await cache.get("impressum.txt", kind="text")
+    del fake_upstream.files["impressum.txt"]
+    clock.now += 61
+
+    assert await cache.get("impressum.txt", kind="text") == "Alltagslabor Impressum"
+    await wait_for_refresh(cache, "impressum.txt")
+    assert await cache.get("impressum.txt", kind="text") == "Alltagslabor Impressum"
+
+
+@pytest.mark.anyio
+async def test_size_bound_evicts_least_recently_used(fake_upstream, clock):
+    cache = UpstreamCache(UpstreamClient(fake_upstream.url), max_bytes=100, clock=clock)
+    await cache.get("subjects.json")
+    await cache.get("impressum.txt", kind="text")
+    await cache.get("subjects.json")
+    await cache.get("typeOfSchoole.json")
+
+    assert "impressum.txt" not in cache
+    assert "subjects.json" in cache
+    assert cache.size <= 100
+
+
+@pytest.mark.anyio
+async def test_cold_miss_during_refresh_loads_its_own_entry(cache, fake_upstream, clock):
+    await cache.get("subjects.json")
+    clock.now += 61
+    fake_upstream.delay = 0.1
+    await cache.get("subjects.json")
+    assert cache.refreshing("subjects.json")
+    # Evicted while the background refresh is still running
+    cache.invalidate("subjects.json")
+
+    entry = await cache.get_entry("subjects.json")
+    assert entry is not None and "Sachsen" in entry.value
+    await wait_for_refresh(cache, "subjects.json")
@@ -0,0 +1,160 @@
+import time
+
+import httpx
+import pytest
+
+from cache import UpstreamCache
+from responses import STALE_WARNING
+from snapshot import Snapshot
+from upstream import CircuitBreaker, CircuitOpenError, UpstreamClient
+from tests.helpers import FakeClock, asgi_client, wait_for
+
+
+def test_breaker_opens_after_threshold_and_probes_one_at_a_time():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, clock=clock)
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.failures == 0
+
+    for _ in range(3):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_request()
+    assert raised.value.retry_after == 10.0
+
+    clock.now += 10.0
+    breaker.before_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    # A failed probe opens the circuit again right away
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 10.0
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_request()
+    breaker.before_request()
+
+
+def test_cancelled_probe_lets_the_next_request_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5.0, clock=clock)
+    breaker.record_failure()
+    clock.now += 5.0
+    breaker.before_request()
+    breaker.release()
+    breaker.before_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def degraded(server, fake_upstream, monkeypatch, tmp_path, clock):
+    """The server with a quickly opening breaker, a short timeout and a snapshot to fall back to"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0, clock=clock)
+    client = UpstreamClient(fake_upstream.url, timeout=httpx.Timeout(0.2), breaker=breaker)
+    snapshot = Snapshot(tmp_path / "snapshot")
+    monkeypatch.setattr(server, "upstream", client)
+    monkeypatch.setattr(server, "_snapshot", snapshot)
+    monkeypatch.setattr(
+        server,
+        "_cache",
+        UpstreamCache(
+            client, ttls=server.CACHE_TTLS, clock=clock,
+            on_update=server.save_snapshot_file, fallback=server.load_snapshot_file,
+        ),
+    )
+    return server
+
+
+@pytest.mark.anyio
+async def test_open_circuit_fails_fast_on_cold_miss(degraded, fake_upstream):
+    fake_upstream.error_status = 503
+    async with asgi_client(degraded.app) as client:
+        first = [await client.get("/api/impressum") for _ in range(2)]
+        hits = fake_upstream.hits["impressum.txt"]
+        rejected = await client.get("/api/impressum")
+
+    assert [response.status_code for response in first] == [500, 500]
+    assert hits == 2
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "30"
+    assert fake_upstream.hits["impressum.txt"] == hits
+
+
+@pytest.mark.anyio
+async def test_timeouts_open_the_circuit(degraded, fake_upstream):
+    fake_upstream.delay = 0.5
+    async with asgi_client(degraded.app) as client:
+        for _ in range(2):
+            assert (await client.get("/api/subjects")).status_code == 500
+        started = time.perf_counter()
+        rejected = await client.get("/api/subjects")
+        elapsed = time.perf_counter() - started
+
+    assert degraded.upstream.breaker.state == CircuitBreaker.OPEN
+    assert rejected.status_code == 503
+    assert elapsed < 0.1
+
+
+@pytest.mark.anyio
+async def test_stale_data_is_served_with_warning(degraded, fake_upstream, clock):
+    async with asgi_client(degraded.app) as client:
+        fresh = await client.get("/api/impressum")
+        fake_upstream.error_status = 502
+        clock.now += 3600.0
+        # Served from the expired entry while a refresh fails in the background
+        await client.get("/api/impressum")
+        await wait_for(lambda: not degraded._cache.refreshing("impressum.txt"))
+        stale = await client.get("/api/impressum")
+        other = await client.get("/api/healthz")
+
+    assert fresh.status_code == 200 and "Warning" not in fresh.headers
+    assert stale.status_code == 200
+    assert stale.json() == fresh.json()
+    assert stale.headers["Warning"] == STALE_WARNING
+    assert "Warning" not in other.headers
+
+
+@pytest.mark.anyio
+async def test_cold_miss_falls_back_to_snapshot(degraded, fake_upstream):
+    async with asgi_client(degraded.app) as client:
+        fresh = await client.get("/api/subjects")
+        await wait_for(lambda: degraded._snapshot.load_file("subjects.json") is not None)
+        degraded._cache.clear()
+        fake_upstream.error_status = 500
+        fallback = await client.get("/api/subjects")
+
+    assert fallback.status_code == 200
+    assert fallback.json() == fresh.json()
+    assert fallback.headers["Warning"] == STALE_WARNING
+
+
+@pytest.mark.anyio
+async def test_half_open_probe_recovers(degraded, fake_upstream, clock):
+    fake_upstream.error_status = 503
+    async with asgi_client(degraded.app) as client:
+        for _ in range(2):
+            await client.get("/api/impressum")
+        assert (await client.get("/api/impressum")).status_code == 503
+
+        fake_upstream.error_status = None
+        clock.now += 30.0
+        recovered = await client.get("/api/impressum")
+
+    assert recovered.status_code == 200
+    assert "Warning" not in recovered.headers
+    assert degraded.upstream.breaker.state == CircuitBreaker.CLOSED
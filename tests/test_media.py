@@ -0,0 +1,207 @@
+import io
+import time
+
+import pytest
+
+from media import MediaCache, parse_range, variant_width
+from tests.helpers import asgi_client
+
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+requires_pillow = pytest.mark.skipif(Image is None, reason="Pillow is not installed")
+
+AUDIO = bytes(range(256)) * 40
+
+
+def jpeg(width, height):
+    output = io.BytesIO()
+    Image.effect_noise((width, height), 64).convert("RGB").save(output, "JPEG", quality=95)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=0-1,5-9", None),
+    ("items=0-9", None),
+    ("bytes=9-0", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+def test_variant_width_rounds_up():
+    assert variant_width(1) == 160
+    assert variant_width(480) == 480
+    assert variant_width(481) == 640
+    assert variant_width(10000) == 1920
+
+
+def test_cache_stores_identical_content_once(tmp_path):
+    cache = MediaCache(tmp_path)
+    first = cache.put("a.mp3", AUDIO, "audio/mpeg")
+    second = cache.put("copy/a.mp3", AUDIO, "audio/mpeg")
+    assert first.digest == second.digest
+    assert cache.size == len(AUDIO)
+    assert len(list((tmp_path / "objects").rglob("*"))) == 2  # one shard directory, one blob
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = MediaCache(tmp_path, max_bytes=2500)
+    old = cache.put("old.png", b"o" * 1000, "image/png")
+    cache.put("used.png", b"u" * 1000, "image/png")
+    cache.get("old.png")
+    cache.put("new.png", b"n" * 1000, "image/png")
+
+    assert "used.png" not in cache
+    assert "old.png" in cache and "new.png" in cache
+    assert cache.size == 2000
+    assert cache.blob_path(old.digest).is_file()
+    assert len(list((tmp_path / "refs").iterdir())) == 2
+
+
+def test_linked_ref_shares_the_blob(tmp_path):
+    cache = MediaCache(tmp_path, max_bytes=1500)
+    original = cache.put("big.png", b"b" * 1000, "image/png")
+    variant = cache.link("big.png?w=160", original)
+    assert variant.digest == original.digest and variant.media_type == "image/png"
+    assert cache.size == 1000
+
+    # The blob stays while any ref to it is left
+    cache.put("other.png", b"o" * 400, "image/png")
+    cache.get("big.png?w=160")
+    cache.put("new.png", b"n" * 400, "image/png")
+    assert "big.png" not in cache
+    assert cache.read(cache.get("big.png?w=160")) == b"b" * 1000
+
+
+def test_cache_survives_restart(tmp_path):
+    cache = MediaCache(tmp_path)
+    entry = cache.put("sound.mp3", AUDIO, "audio/mpeg", etag='"abc"')
+
+    reloaded = MediaCache(tmp_path)
+    assert reloaded.get("sound.mp3") == entry
+    assert reloaded.read(entry, 10, 19) == AUDIO[10:20]
+
+
+@pytest.mark.anyio
+async def test_media_is_fetched_once_and_cached(server, fake_upstream):
+    fake_upstream.files["audio/klang.mp3"] = AUDIO
+    async with asgi_client(server.app) as client:
+        first = await client.get("/api/media/audio/klang.mp3")
+        second = await client.get("/api/media/audio/klang.mp3")
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == AUDIO
+    assert first.headers["content-type"] == "audio/mpeg"
+    assert first.headers["accept-ranges"] == "bytes"
+    assert first.headers["etag"] == second.headers["etag"]
+    assert fake_upstream.hits["audio/klang.mp3"] == 1
+
+
+@pytest.mark.anyio
+async def test_media_evicted_during_refresh_is_fetched_again(server, fake_upstream):
+    fake_upstream.files["audio/klang.mp3"] = AUDIO
+    proxy = server._media
+    entry = await proxy.original("audio/klang.mp3")
+    entry.fetched_at = time.time() - proxy.ttl
+    fake_upstream.delay = 0.1
+    await proxy.original("audio/klang.mp3")
+    # Evicted (e.g. by another worker) while the background refresh is running
+    proxy.cache.blob_path(entry.digest).unlink()
+
+    async with asgi_client(server.app) as client:
+        response = await client.get("/api/media/audio/klang.mp3")
+    assert response.status_code == 200
+    assert response.content == AUDIO
+
+
+@pytest.mark.anyio
+async def test_media_range_requests(server, fake_upstream):
+    fake_upstream.files["audio/klang.mp3"] = AUDIO
+    async with asgi_client(server.app) as client:
+        partial = await client.get("/api/media/audio/klang.mp3", headers={"Range": "bytes=100-199"})
+        tail = await client.get("/api/media/audio/klang.mp3", headers={"Range": "bytes=-10"})
+        beyond = await client.get("/api/media/audio/klang.mp3", headers={"Range": f"bytes={len(AUDIO)}-"})
+        stale = await client.get(
+            "/api/media/audio/klang.mp3", headers={"Range": "bytes=0-9", "If-Range": '"outdated"'},
+        )
+
+    assert partial.status_code == 206
+    assert partial.content == AUDIO[100:200]
+    assert partial.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+    assert tail.content == AUDIO[-10:]
+    assert beyond.status_code == 416
+    assert beyond.headers["content-range"] == f"bytes */{len(AUDIO)}"
+    assert stale.status_code == 200 and stale.content == AUDIO
+
+
+@pytest.mark.anyio
+async def test_media_not_modified(server, fake_upstream):
+    fake_upstream.files["audio/klang.mp3"] = AUDIO
+    async with asgi_client(server.app) as client:
+        etag = (await client.get("/api/media/audio/klang.mp3")).headers["etag"]
+        response = await client.get("/api/media/audio/klang.mp3", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+@pytest.mark.anyio
+async def test_media_rejects_other_files_and_reports_missing(server, fake_upstream):
+    async with asgi_client(server.app) as client:
+        assert (await client.get("/api/media/_experiments.json")).status_code == 400
+        assert (await client.get("/api/media/images/%2E%2E/secret.png")).status_code == 400
+        assert (await client.get("/api/media/images/missing.png")).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_uncached_media_is_unavailable_offline(server, fake_upstream):
+    fake_upstream.files["audio/klang.mp3"] = AUDIO
+    server._media.offline = True
+    async with asgi_client(server.app) as client:
+        response = await client.get("/api/media/audio/klang.mp3")
+    assert response.status_code == 503
+    assert fake_upstream.hits["audio/klang.mp3"] == 0
+
+
+@requires_pillow
+@pytest.mark.anyio
+async def test_resized_variants_are_cached(server, fake_upstream):
+    original = jpeg(1200, 800)
+    fake_upstream.files["bilder/versuch.jpg"] = original
+    async with asgi_client(server.app) as client:
+        first = await client.get("/api/media/bilder/versuch.jpg?w=450")
+        second = await client.get("/api/media/bilder/versuch.jpg?w=480")
+        webp = await client.get("/api/media/bilder/versuch.jpg?w=480", headers={"Accept": "image/webp,*/*"})
+        small = await client.get("/api/media/bilder/versuch.jpg?w=1920")
+        plain = await client.get("/api/media/bilder/versuch.jpg")
+
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "image/jpeg"
+    assert len(first.content) < len(original)
+    assert Image.open(io.BytesIO(first.content)).size == (480, 320)
+    assert second.content == first.content
+    assert webp.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(webp.content)).size == (480, 320)
+    # Never upscaled: the original is served instead
+    assert small.content == original
+    assert small.headers["etag"] == plain.headers["etag"]
+    assert fake_upstream.hits["bilder/versuch.jpg"] == 1
+    prefix = f"bilder/versuch.jpg@{server._media.cache.get('bilder/versuch.jpg').digest[:16]}"
+    assert f"{prefix}?w=480" in server._media.cache
+    # Remembered without a copy, so the original is not decoded again
+    assert f"{prefix}?w=1920" in server._media.cache
+    assert server._media.cache.size == len(original) + len(first.content) + len(webp.content)
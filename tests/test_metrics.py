@@ -0,0 +1,79 @@
+import pytest
+
+from metrics import CACHE_REQUESTS, Counter, Gauge, Histogram, Registry
+from tests.helpers import asgi_client
+
+
+def test_text_exposition_format():
+    registry = Registry()
+    requests = Counter("demo_requests_total", "Requests", ("route",), registry=registry)
+    size = Gauge("demo_size_bytes", "Size", registry=registry)
+    latency = Histogram("demo_seconds", "Latency", ("route",), buckets=(0.1, 1.0), registry=registry)
+
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    size.set(1024)
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(5, route="/a")
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_requests_total Requests",
+        "# TYPE demo_requests_total counter",
+        'demo_requests_total{route="/a\\"b"} 3',
+        "# HELP demo_size_bytes Size",
+        "# TYPE demo_size_bytes gauge",
+        "demo_size_bytes 1024",
+        "# HELP demo_seconds Latency",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{route="/a",le="0.1"} 1',
+        'demo_seconds_bucket{route="/a",le="1"} 2',
+        'demo_seconds_bucket{route="/a",le="+Inf"} 3',
+        'demo_seconds_sum{route="/a"} 5.55',
+        'demo_seconds_count{route="/a"} 3',
+    ]
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint_covers_the_hot_path(server):
+    hits = CACHE_REQUESTS.value(file="_experiments.json", result="hit")
+    async with asgi_client(server.app) as client:
+        await client.get("/api/experiments/search", params={"subject": "Physik"})
+        await client.get("/api/experiments/search", params={"freetext": "Magnet"})
+        response = await client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    for sample in (
+        'alltagslabor_request_duration_seconds_count{method="GET",route="/api/experiments/search",status="200"}',
+        'alltagslabor_cache_requests_total{file="_experiments.json",result="miss"}',
+        'alltagslabor_cache_refreshes_total{file="_experiments.json",result="updated"}',
+        'alltagslabor_upstream_request_duration_seconds_count{file="_experiments.json",status="200"}',
+        'alltagslabor_upstream_bytes_total{file="_experiments.json"}',
+        'alltagslabor_index_build_seconds_count{dataset="_experiments.json"}',
+        'alltagslabor_dataset_experiments{dataset="_experiments.json"} 4',
+        'alltagslabor_search_results_count{kind="filter"}',
+        'alltagslabor_search_results_count{kind="freetext"}',
+        "alltagslabor_cache_bytes ",
+    ):
+        assert sample in text, sample
+    assert CACHE_REQUESTS.value(file="_experiments.json", result="hit") == hits + 1
+
+
+@pytest.mark.anyio
+async def test_server_timing_is_opt_in(server):
+    async with asgi_client(server.app) as client:
+        plain = await client.get("/api/experiments/search", params={"subject": "Physik"})
+        profiled = await client.get(
+            "/api/experiments/search", params={"subject": "Physik"}, headers={"X-Profile": "1"},
+        )
+        cached = await client.get("/api/experiments", headers={"X-Profile": "1"})
+
+    assert "Server-Timing" not in plain.headers
+    stages = [part.split(";")[0] for part in profiled.headers["Server-Timing"].split(", ")]
+    # The store is already loaded, and full experiments are joined from their
+    # encoded form, without response_model validation
+    assert stages == ["fetch", "filter", "serialize", "total"]
+    assert profiled.json() == plain.json()
+    assert "encode" in cached.headers["Server-Timing"]
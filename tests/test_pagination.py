@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+from tests.helpers import SAMPLE_EXPERIMENTS, asgi_client
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("0123456789abcdef", 20, "waerme", "q1")
+    assert decode_cursor(cursor) == ("0123456789ab", 20, "waerme", "q1")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.anyio
+async def test_summary_view_and_field_projection(server):
+    async with asgi_client(server.app) as client:
+        summary = (await client.get("/api/experiments", params={"view": "summary"})).json()
+        assert summary[0] == {
+            "id": "mechanik-experimente-b585acf4",
+            "title": "Mechanik Experimente",
+            "shortDescription": "Kräfte und Bewegung im Alltag",
+            "subject": "Physik",
+            "gradeLevel": "7",
+            "schoolType": "Gymnasium",
+        }
+
+        projected = (await client.get("/api/experiments/search", params={"subject": "Chemie", "fields": "title,steps"})).json()
+        assert projected == [{"title": "Säuren im Haushalt", "steps": [
+            {"type": "text", "content": "Gib Rotkohlsaft in die Gläser mit Essig.", "description": ""}
+        ]}]
+
+        response = await client.get("/api/experiments", params={"fields": "title,secret"})
+        assert response.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_cursor_walks_all_pages(server):
+    async with asgi_client(server.app) as client:
+        seen = []
+        params = {"limit": 3, "view": "summary"}
+        while True:
+            response = await client.get("/api/experiments", params=params)
+            seen += [exp["id"] for exp in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            params["cursor"] = cursor
+
+    assert len(seen) == len(SAMPLE_EXPERIMENTS)
+    assert len(set(seen)) == len(seen)
+
+
+@pytest.mark.anyio
+async def test_listing_cursor_survives_dataset_change(server, fake_upstream):
+    async with asgi_client(server.app) as client:
+        first = await client.get("/api/experiments/search", params={"subject": "Physik", "limit": 1})
+        assert [exp["title"] for exp in first.json()] == ["Mechanik Experimente"]
+        cursor = first.headers["X-Next-Cursor"]
+
+        new_first = dict(SAMPLE_EXPERIMENTS[0], title="Neues Experiment")
+        fake_upstream.files["_experiments.json"] = json.dumps([new_first] + SAMPLE_EXPERIMENTS)
+        await server._cache.refresh("_experiments.json")
+
+        second = await client.get("/api/experiments/search", params={"subject": "Physik", "limit": 1, "cursor": cursor})
+        assert [exp["title"] for exp in second.json()] == ["Wärme und Temperatur"]
+
+        ranked = await client.get("/api/experiments/search", params={"freetext": "physik", "cursor": cursor})
+        assert ranked.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_cursor_is_rejected_for_another_query(server):
+    async with asgi_client(server.app) as client:
+        first = await client.get("/api/experiments/search", params={"subject": "Physik", "limit": 1})
+        cursor = first.headers["X-Next-Cursor"]
+
+        same = await client.get("/api/experiments/search", params={"subject": "Physik", "limit": 1, "cursor": cursor})
+        other = await client.get("/api/experiments/search", params={"subject": "Chemie", "limit": 1, "cursor": cursor})
+        projected = await client.get(
+            "/api/experiments/search", params={"subject": "Physik", "fields": "title", "limit": 1, "cursor": cursor}
+        )
+
+    assert same.status_code == 200
+    assert other.status_code == 400
+    assert projected.status_code == 400
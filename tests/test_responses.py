@@ -0,0 +1,163 @@
+import json
+
+import pytest
+
+import responses
+from responses import NDJSON_MEDIA_TYPE, EncodedBody, accepted_encodings, choose_encoding, ndjson_chunks
+from tests.helpers import asgi_client
+
+requires_brotli = pytest.mark.skipif(responses.brotli is None, reason="brotli is not installed")
+
+
+def test_accept_encoding_parsing():
+    assert accepted_encodings("gzip, br;q=0.5, identity;q=0") == {"gzip": 1.0, "br": 0.5, "identity": 0.0}
+
+
+@requires_brotli
+def test_encoding_negotiation_prefers_brotli():
+    body = EncodedBody.from_json(["x" * 1000])
+    assert choose_encoding(body, "gzip, deflate, br") == "br"
+    assert choose_encoding(body, "gzip, br;q=0") == "gzip"
+    assert choose_encoding(body, "") == "identity"
+
+
+def test_small_bodies_are_not_compressed():
+    body = EncodedBody.from_json({"content": "kurz"})
+    assert body.available() == ()
+    assert choose_encoding(body, "gzip, br") == "identity"
+
+
+@requires_brotli
+@pytest.mark.anyio
+async def test_experiments_are_served_precompressed_with_etag(server):
+    async with asgi_client(server.app) as client:
+        plain = await client.get("/api/experiments", headers={"Accept-Encoding": "identity"})
+        raw = await client.get("/api/experiments", headers={"Accept-Encoding": "br"})
+        zipped = await client.get("/api/experiments", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert raw.headers["Content-Encoding"] == "br"
+    # httpx decodes the body transparently
+    assert raw.json() == plain.json()
+    assert zipped.json() == plain.json()
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert plain.json()[0]["steps"][0]["description"] == ""
+    assert len({plain.headers["ETag"], raw.headers["ETag"], zipped.headers["ETag"]}) == 3
+
+
+@pytest.mark.anyio
+async def test_if_none_match_returns_304(server):
+    async with asgi_client(server.app) as client:
+        for path in (
+            "/api/experiments", "/api/subjects", "/api/school-types", "/api/grades", "/api/impressum", "/api/bootstrap",
+        ):
+            first = await client.get(path)
+            assert first.status_code == 200
+            second = await client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+            assert second.status_code == 304
+            assert second.content == b""
+
+
+@pytest.mark.anyio
+async def test_etag_changes_with_dataset(server, fake_upstream):
+    async with asgi_client(server.app) as client:
+        first = await client.get("/api/grades")
+        assert first.json() == ["5", "7", "8"]
+
+        fake_upstream.files["_experiments.json"] = "[]"
+        await server._cache.refresh("_experiments.json")
+        await server.store_for_file("_experiments.json", wait=True)
+
+        second = await client.get("/api/grades", headers={"If-None-Match": first.headers["ETag"]})
+        assert second.status_code == 200
+        assert second.json() == []
+
+
+@pytest.mark.anyio
+async def test_bootstrap_bundles_launch_data(server, fake_upstream):
+    async with asgi_client(server.app) as client:
+        bundle = await client.get("/api/bootstrap")
+        parts = {
+            "experiments": (await client.get("/api/experiments")).json(),
+            "subjects": (await client.get("/api/subjects")).json(),
+            "schoolTypes": (await client.get("/api/school-types")).json(),
+            "grades": (await client.get("/api/grades")).json(),
+            "impressum": (await client.get("/api/impressum")).json(),
+        }
+        summary = await client.get("/api/bootstrap?view=summary")
+
+    assert bundle.status_code == 200
+    body = bundle.json()
+    assert {key: body[key] for key in parts} == parts
+    assert summary.json()["version"] == body["version"]
+    assert "steps" not in summary.json()["experiments"][0]
+    assert summary.headers["ETag"] != bundle.headers["ETag"]
+
+
+@pytest.mark.anyio
+async def test_bootstrap_version_follows_every_file(server, fake_upstream):
+    async with asgi_client(server.app) as client:
+        first = await client.get("/api/bootstrap")
+        assert (await client.get("/api/bootstrap", headers={"If-None-Match": first.headers["ETag"]})).status_code == 304
+
+        fake_upstream.files["impressum.txt"] = "Neues Impressum"
+        await server._cache.refresh("impressum.txt", kind="text")
+
+        second = await client.get("/api/bootstrap", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.json()["impressum"] == {"content": "Neues Impressum"}
+    assert second.json()["version"] != first.json()["version"]
+
+
+def parse_ndjson(body: bytes):
+    assert body.endswith(b"\n")
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_ndjson_chunks_are_batched_lines():
+    items = ({"n": i} for i in range(5))
+    chunks = list(ndjson_chunks(items, chunk_bytes=16))
+    assert chunks == [b'{"n":0}\n{"n":1}\n', b'{"n":2}\n{"n":3}\n', b'{"n":4}\n']
+    assert list(ndjson_chunks([])) == []
+
+
+@pytest.mark.anyio
+async def test_stream_matches_json_listing(server):
+    async with asgi_client(server.app) as client:
+        listing = await client.get("/api/experiments")
+        stream = await client.get("/api/experiments/stream")
+        negotiated = await client.get("/api/experiments", headers={"Accept": NDJSON_MEDIA_TYPE})
+        page = await client.get("/api/experiments/stream", params={"limit": 2, "offset": 1, "view": "summary"})
+
+    assert stream.status_code == 200
+    assert stream.headers["content-type"] == NDJSON_MEDIA_TYPE
+    assert parse_ndjson(stream.content) == listing.json()
+    assert parse_ndjson(negotiated.content) == listing.json()
+    assert "Accept" in listing.headers["Vary"] and "Accept" in negotiated.headers["Vary"]
+    assert [exp["title"] for exp in parse_ndjson(page.content)] == [exp["title"] for exp in listing.json()[1:3]]
+    assert "steps" not in parse_ndjson(page.content)[0]
+
+
+@pytest.mark.anyio
+async def test_stream_uses_search_filters(server):
+    queries = [
+        {"subject": "Physik"},
+        {"freetext": "Magnet"},
+        {"subject": "Physik", "gradeLevel": "7", "fields": "id,title"},
+        {"schoolType": "Gymnasium", "limit": 1},
+    ]
+    async with asgi_client(server.app) as client:
+        for params in queries:
+            search = await client.get("/api/experiments/search", params=params)
+            stream = await client.get("/api/experiments/stream", params=params)
+            negotiated = await client.get(
+                "/api/experiments/search", params=params, headers={"Accept": NDJSON_MEDIA_TYPE}
+            )
+            assert parse_ndjson(stream.content) == search.json(), params
+            assert parse_ndjson(negotiated.content) == search.json(), params
+
+        empty = await client.get("/api/experiments/stream", params={"subject": "Kunst"})
+        cursor = await client.get("/api/experiments", params={"cursor": "x"}, headers={"Accept": NDJSON_MEDIA_TYPE})
+
+    assert empty.status_code == 200 and empty.content == b""
+    assert cursor.status_code == 400
@@ -0,0 +1,60 @@
+from search import TextIndex, analyze, fold, stem
+
+
+def test_fold_handles_umlauts_and_sharp_s():
+    assert fold("Wärme") == fold("Waerme") == "waerme"
+    assert fold("Straße") == "strasse"
+    assert fold("Café") == "cafe"
+
+
+def test_stem_removes_one_inflectional_ending():
+    assert stem("experimente") == stem("experimenten") == "experiment"
+    assert stem("magneten") == "magnet"
+    assert stem("salz") == "salz"
+
+
+def test_analyze_matches_spelling_variants():
+    assert analyze("Wärmen") == analyze("WAERME")
+
+
+def index(*docs):
+    return TextIndex([{"title": t, "shortDescription": d, "steps": s} for t, d, s in docs])
+
+
+def test_title_matches_rank_above_step_matches():
+    idx = index(
+        ("Licht und Schatten", "", "Wir messen die Wärme der Lampe."),
+        ("Wärme im Alltag", "", "Ein Thermometer wird benötigt."),
+        ("Strom", "", "Nichts davon."),
+    )
+    assert [doc for doc, _ in idx.search("Waerme")] == [1, 0]
+
+
+def test_all_query_terms_must_match():
+    idx = index(
+        ("Wärme leiten", "Metall", ""),
+        ("Wärme speichern", "Wasser", ""),
+    )
+    assert [doc for doc, _ in idx.search("wärme wasser")] == [1]
+    assert idx.search("wärme holz") == []
+
+
+def test_prefix_matches_partial_words():
+    idx = index(("Mechanik", "", ""), ("Optik", "", ""))
+    assert [doc for doc, _ in idx.search("Mech")] == [0]
+
+
+def test_candidates_limit_and_offset():
+    idx = index(*[(f"Magnet {i}", "", "") for i in range(10)])
+    assert [doc for doc, _ in idx.search("magnet", limit=3)] == [0, 1, 2]
+    assert [doc for doc, _ in idx.search("magnet", limit=3, offset=3)] == [3, 4, 5]
+    assert [doc for doc, _ in idx.search("magnet", candidates={7, 2})] == [2, 7]
+
+
+def test_short_terms_rank_but_do_not_filter():
+    idx = index(("Licht", "", ""), ("UV Licht", "", ""), ("Strom", "", ""))
+    # The first keystrokes still list everything, exact matches first
+    assert [doc for doc, _ in idx.search("u")] == [0, 1, 2]
+    assert [doc for doc, _ in idx.search("uv")] == [1, 0, 2]
+    assert [doc for doc, _ in idx.search("uv", candidates={0, 2})] == [0, 2]
+    assert [doc for doc, _ in idx.search("licht uv")] == [1, 0]
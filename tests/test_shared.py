@@ -0,0 +1,171 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import shared
+import store
+from cache import CacheEntry, UpstreamCache
+from shared import LoaderLock, SharedClient
+from snapshot import Snapshot
+from store import StoreRegistry
+from tests.helpers import SAMPLE_EXPERIMENTS, asgi_client, wait_for
+
+requires_flock = pytest.mark.skipif(shared.fcntl is None, reason="fcntl is not available")
+
+
+def publish(snapshot, filename, content, kind="json"):
+    data = content.encode("utf-8")
+    entry = CacheEntry(value=None, etag=None, digest=f"digest-of-{len(data)}", size=len(data), fetched_at=0.0, kind=kind)
+    snapshot.save_file(filename, entry, data)
+    return entry
+
+
+@requires_flock
+def test_only_one_process_holds_the_loader_lock(tmp_path):
+    first = LoaderLock(tmp_path / "loader.lock")
+    second = LoaderLock(tmp_path / "loader.lock")
+    assert first.try_acquire()
+    assert not second.try_acquire()
+
+    first.release()
+    assert second.try_acquire()
+    assert second.held
+    second.release()
+
+
+@pytest.mark.anyio
+async def test_shared_client_serves_published_files(tmp_path):
+    snapshot = Snapshot(tmp_path)
+    entry = publish(snapshot, "subjects.json", '["Physik"]')
+    client = SharedClient(snapshot)
+
+    response = await client.get("subjects.json")
+    assert response.status_code == 200
+    assert response.json() == ["Physik"]
+    assert response.headers["etag"] == f'"{entry.digest}"'
+
+    revalidated = await client.get("subjects.json", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.get("missing.json")
+
+
+@pytest.mark.anyio
+async def test_shared_client_falls_back_for_unpublished_files(tmp_path, fake_upstream):
+    from upstream import UpstreamClient
+
+    fallback = UpstreamClient(fake_upstream.url)
+    client = SharedClient(Snapshot(tmp_path), fallback=fallback)
+    response = await client.get("impressum.txt")
+    assert response.text == "Alltagslabor Impressum"
+    assert fake_upstream.hits["impressum.txt"] == 1
+    await fallback.aclose()
+
+
+@pytest.mark.anyio
+async def test_shared_client_waits_for_files_the_loader_is_loading(tmp_path, fake_upstream):
+    from upstream import UpstreamClient
+
+    snapshot = Snapshot(tmp_path)
+    fallback = UpstreamClient(fake_upstream.url)
+    client = SharedClient(snapshot, fallback=fallback, expected={"subjects.json"}, wait=5.0)
+
+    pending = asyncio.ensure_future(client.get("subjects.json"))
+    await asyncio.sleep(0.2)
+    publish(snapshot, "subjects.json", '["Chemie"]')
+    assert (await pending).json() == ["Chemie"]
+    assert fake_upstream.hits["subjects.json"] == 0
+    await fallback.aclose()
+
+
+@pytest.fixture
+def loader(server, tmp_path, monkeypatch):
+    """The server module as loader publishing into a temporary snapshot directory"""
+    snapshot = Snapshot(tmp_path / "shared")
+    monkeypatch.setattr(server, "_snapshot", snapshot)
+    monkeypatch.setattr(server, "_role", "single")
+    monkeypatch.setattr(server._cache, "on_update", server.save_snapshot_file)
+    return snapshot
+
+
+def start_worker(server, monkeypatch):
+    """Fresh in-memory state, as in a newly started worker process"""
+    monkeypatch.setattr(server, "_cache", UpstreamCache(server.upstream))
+    monkeypatch.setattr(server, "_stores", StoreRegistry())
+    monkeypatch.setattr(server, "SHARED_POLL_SECONDS", 0.0)
+    monkeypatch.setattr(server, "SHARED_WAIT_SECONDS", 0.2)
+    server.become_worker()
+    server.restore_snapshot()
+
+
+@pytest.mark.anyio
+async def test_workers_serve_published_data_without_upstream(server, loader, fake_upstream, monkeypatch):
+    await server.prewarm()
+    digest = server._cache.peek("_experiments.json").digest
+    await wait_for(lambda: loader.load_store("_experiments.json", digest) is not None)
+    await wait_for(lambda: len(loader.published_files()) == len(server.UPSTREAM_FILES))
+    hits = sum(fake_upstream.hits.values())
+
+    start_worker(server, monkeypatch)
+    # Workers attach the loader's prebuilt store instead of indexing themselves
+    monkeypatch.setattr(store, "ExperimentStore", lambda *args, **kwargs: pytest.fail("worker rebuilt the store"))
+    async with asgi_client(server.app) as client:
+        search = await client.get("/api/experiments/search", params={"freetext": "Magnet"})
+        assert [exp["title"] for exp in search.json()] == ["Magnetismus entdecken"]
+        assert (await client.get("/api/impressum")).json() == {"content": "Alltagslabor Impressum"}
+
+    assert server._role == "worker"
+    assert sum(fake_upstream.hits.values()) == hits
+
+
+@pytest.mark.anyio
+async def test_workers_switch_to_newly_published_versions(server, loader, fake_upstream, monkeypatch):
+    await server.prewarm()
+    await wait_for(lambda: len(loader.published_files()) == len(server.UPSTREAM_FILES))
+    loader_cache = server._cache
+
+    start_worker(server, monkeypatch)
+    async with asgi_client(server.app) as client:
+        assert len((await client.get("/api/experiments")).json()) == len(SAMPLE_EXPERIMENTS)
+
+        # The loader picks up a new upstream version and publishes it
+        fake_upstream.files["_experiments.json"] = json.dumps(SAMPLE_EXPERIMENTS[:1])
+        new = await loader_cache.refresh("_experiments.json")
+        await wait_for(lambda: loader.file_header("_experiments.json")["digest"] == new.digest)
+
+        await client.get("/api/experiments")
+        await wait_for(lambda: server._cache.peek("_experiments.json").digest == new.digest)
+        # The previous version is served until the new store is restored
+        await client.get("/api/experiments")
+        await wait_for(lambda: server._stores.peek("_experiments.json").digest == new.digest)
+        assert len((await client.get("/api/experiments")).json()) == 1
+
+
+@pytest.mark.anyio
+async def test_workers_only_wait_for_stores_the_loader_builds(server, loader, fake_upstream, monkeypatch):
+    await server.prewarm()
+    await wait_for(lambda: len(loader.published_files()) == len(server.UPSTREAM_FILES))
+
+    start_worker(server, monkeypatch)
+    monkeypatch.setattr(server, "SHARED_WAIT_SECONDS", 5.0)
+    server._stores.clear()
+    load_store = loader.load_store
+    loads = []
+
+    def counting_load_store(*args):
+        loads.append(args[0])
+        return load_store(*args)
+
+    monkeypatch.setattr(loader, "load_store", counting_load_store)
+    async with asgi_client(server.app) as client:
+        # Concurrent requests share one unpickle of the published store
+        responses = await asyncio.gather(*[client.get("/api/experiments") for _ in range(3)])
+        assert all(len(response.json()) == len(SAMPLE_EXPERIMENTS) for response in responses)
+        assert loads == ["_experiments.json"]
+
+        # The loader does not index other languages, so there is nothing to wait for
+        english = await asyncio.wait_for(client.get("/api/experiments", params={"lang": "en"}), timeout=2.0)
+        assert english.status_code == 200
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from cache import UpstreamCache
+from snapshot import Snapshot
+from store import StoreRegistry
+from tests.helpers import asgi_client, wait_for
+
+
+def restart(server, monkeypatch, offline=False):
+    """Fresh in-memory state, as after a process restart"""
+    monkeypatch.setattr(server, "_cache", UpstreamCache(
+        server.upstream, ttls=server.CACHE_TTLS, on_update=server.save_snapshot_file, offline=offline,
+    ))
+    monkeypatch.setattr(server, "_stores", StoreRegistry())
+    server.restore_snapshot()
+
+
+@pytest.fixture
+def snapshot(server, tmp_path, monkeypatch):
+    snapshot = Snapshot(tmp_path / "snapshot")
+    monkeypatch.setattr(server, "_snapshot", snapshot)
+    monkeypatch.setattr(server._cache, "on_update", server.save_snapshot_file)
+    return snapshot
+
+
+async def populate(server, snapshot):
+    async with asgi_client(server.app) as client:
+        assert (await client.get("/api/experiments/search", params={"subject": "Physik"})).status_code == 200
+        assert (await client.get("/api/impressum")).status_code == 200
+    await wait_for(lambda: snapshot.load_store("_experiments.json", server._cache.peek("_experiments.json").digest))
+    await wait_for(lambda: "impressum.txt" in snapshot.load_files())
+
+
+@pytest.mark.anyio
+async def test_offline_mode_serves_snapshot_without_network(server, snapshot, fake_upstream, monkeypatch):
+    await populate(server, snapshot)
+    hits = sum(fake_upstream.hits.values())
+
+    restart(server, monkeypatch, offline=True)
+    # The prebuilt store is restored, not rebuilt
+    assert server._stores.peek("_experiments.json") is not None
+
+    async with asgi_client(server.app) as client:
+        search = await client.get("/api/experiments/search", params={"freetext": "Wärme"})
+        assert [exp["title"] for exp in search.json()] == ["Wärme und Temperatur"]
+        assert (await client.get("/api/impressum")).json() == {"content": "Alltagslabor Impressum"}
+        assert (await client.get("/api/subjects")).status_code == 503
+
+    assert sum(fake_upstream.hits.values()) == hits
+
+
+@pytest.mark.anyio
+async def test_warm_start_serves_snapshot_and_refreshes_in_background(server, snapshot, fake_upstream, monkeypatch):
+    await populate(server, snapshot)
+    fake_upstream.files["_experiments.json"] = "[]"
+    fake_upstream.delay = 0.3
+
+    restart(server, monkeypatch)
+    async with asgi_client(server.app) as client:
+        response = await asyncio.wait_for(client.get("/api/experiments"), timeout=0.2)
+        assert len(response.json()) == 4
+
+        await wait_for(lambda: server._cache.peek("_experiments.json").value == b"[]")
+        await server.store_for_file("_experiments.json", wait=True)
+        assert (await client.get("/api/experiments")).json() == []
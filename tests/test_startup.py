@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import pytest
+
+from tests.helpers import asgi_client
+
+
+@pytest.mark.anyio
+async def test_healthz_is_always_ok(server):
+    async with asgi_client(server.app) as client:
+        response = await client.get("/api/healthz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+@pytest.mark.anyio
+async def test_readyz_reports_warming_until_prewarmed(server, fake_upstream):
+    async with asgi_client(server.app) as client:
+        response = await client.get("/api/readyz")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming"
+
+        await server.warmup_until_ready()
+        response = await client.get("/api/readyz")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready"
+    assert set(body["startup"]["imports"]) == {"framework", "app_modules"}
+    steps = body["startup"]["warmup"]["steps"]
+    assert set(steps) == {f"fetch:{name}" for name in server.UPSTREAM_FILES} | {"index:_experiments.json"}
+
+
+@pytest.mark.anyio
+async def test_prewarm_fetches_and_indexes_everything(server, fake_upstream):
+    await server.prewarm()
+    for name in server.UPSTREAM_FILES:
+        assert fake_upstream.hits[name] == 1
+        assert name in server._cache
+    assert server._stores.peek("_experiments.json") is not None
+
+    # The first user request is served without touching upstream
+    async with asgi_client(server.app) as client:
+        response = await client.get("/api/experiments")
+    assert response.status_code == 200
+    assert sum(fake_upstream.hits.values()) == len(server.UPSTREAM_FILES)
+
+
+@pytest.mark.anyio
+async def test_warmup_retries_until_upstream_is_available(server, fake_upstream, monkeypatch):
+    monkeypatch.setattr(server, "WARMUP_RETRY_DELAY", 0.01)
+    impressum = fake_upstream.files.pop("impressum.txt")
+
+    warmup = asyncio.create_task(server.warmup_until_ready())
+    while fake_upstream.hits["impressum.txt"] < 2:
+        await asyncio.sleep(0.01)
+    assert not server._ready
+
+    fake_upstream.files["impressum.txt"] = impressum
+    await asyncio.wait_for(warmup, timeout=5.0)
+    assert server._ready
+    assert server.STARTUP_REPORT["warmup"]["attempts"] > 1
+
+
+@pytest.mark.anyio
+async def test_building_a_store_does_not_block_other_requests(server, fake_upstream, monkeypatch):
+    build = server._stores.build
+    builds = []
+
+    def slow_build(*args):
+        builds.append(args[0])
+        time.sleep(0.5)
+        return build(*args)
+
+    monkeypatch.setattr(server._stores, "build", slow_build)
+    async with asgi_client(server.app) as client:
+        searches = [
+            asyncio.create_task(client.get("/api/experiments/search", params={"subject": "Physik"}))
+            for _ in range(3)
+        ]
+        while not builds:
+            await asyncio.sleep(0.01)
+        health = await asyncio.wait_for(client.get("/api/healthz"), timeout=0.3)
+        assert health.status_code == 200
+        for response in await asyncio.gather(*searches):
+            assert len(response.json()) == 3
+    assert builds == ["_experiments.json"]
@@ -0,0 +1,260 @@
+import json
+import pickle
+import sys
+
+import pytest
+
+from tests.helpers import SAMPLE_EXPERIMENTS, asgi_client, wait_for
+from models import Experiment
+from records import ExperimentRecord
+from store import ExperimentStore, StoreRegistry
+
+
+@pytest.fixture
+def store():
+    return ExperimentStore(SAMPLE_EXPERIMENTS, digest="abc", version=1)
+
+
+def titles(experiments):
+    return [exp.title for exp in experiments]
+
+
+def test_filters_are_case_insensitive_for_subject_and_school_type(store):
+    assert titles(store.search(subject="physik", schoolType="GYMNASIUM")) == ["Mechanik Experimente"]
+
+
+def test_grade_level_filter_is_exact(store):
+    assert titles(store.search(gradeLevel="7")) == ["Mechanik Experimente", "Säuren im Haushalt"]
+    assert store.search(gradeLevel="07") == []
+
+
+def test_unknown_filter_value_short_circuits(store):
+    assert store.search(subject="Kunst", gradeLevel="7") == []
+
+
+def test_no_filters_returns_all_in_dataset_order(store):
+    assert titles(store.search()) == [exp["title"] for exp in SAMPLE_EXPERIMENTS]
+
+
+def test_freetext_matches_title_description_and_steps(store):
+    assert titles(store.search(freetext="REIBUNG")) == ["Mechanik Experimente"]
+    assert titles(store.search(freetext="essig", subject="Chemie")) == ["Säuren im Haushalt"]
+    # A single keystroke lists everything that matches the filters
+    assert len(store.search(freetext="a")) == len(SAMPLE_EXPERIMENTS)
+    assert titles(store.search(freetext="s", subject="Chemie")) == ["Säuren im Haushalt"]
+
+
+@pytest.mark.anyio
+async def test_store_is_built_once_per_dataset_version(server, fake_upstream):
+    async with asgi_client(server.app) as client:
+        await client.get("/api/experiments/search", params={"subject": "Physik"})
+        first = server._stores.peek("_experiments.json")
+        await client.get("/api/experiments/search", params={"gradeLevel": "8"})
+        assert server._stores.peek("_experiments.json") is first
+
+        fake_upstream.files["_experiments.json"] = "[]"
+        await server._cache.refresh("_experiments.json")
+        # The previous version is served while the new one is built
+        assert len((await client.get("/api/experiments")).json()) == len(SAMPLE_EXPERIMENTS)
+        await wait_for(lambda: server._stores.peek("_experiments.json") is not first)
+        response = await client.get("/api/experiments")
+        assert response.json() == []
+
+
+def test_experiments_get_stable_slug_ids(store):
+    assert [exp.id for exp in store.experiments] == [
+        "mechanik-experimente-b585acf4",
+        "waerme-und-temperatur-b90cfe78",
+        "saeuren-im-haushalt-db5738e1",
+        "magnetismus-entdecken-6471058b",
+    ]
+    assert store.experiments[store.by_id["waerme-und-temperatur-b90cfe78"]].title == "Wärme und Temperatur"
+    assert "unknown" not in store.by_id
+
+
+def test_duplicate_titles_get_distinct_ids():
+    raw = [dict(SAMPLE_EXPERIMENTS[0]), dict(SAMPLE_EXPERIMENTS[0], gradeLevel="9")]
+    store = ExperimentStore(raw)
+    first, second = store.experiments
+    assert first.id == "mechanik-experimente-b585acf4"
+    assert second.id.startswith("mechanik-experimente-") and second.id != first.id
+    assert store.by_title["Mechanik Experimente"] == 0
+
+    # Inserting or reordering copies does not move IDs between experiments
+    reordered = ExperimentStore([dict(SAMPLE_EXPERIMENTS[0], gradeLevel="6")] + raw[::-1])
+    assert reordered.experiments[reordered.by_id[first.id]].gradeLevel == first.gradeLevel
+    assert reordered.experiments[reordered.by_id[second.id]].gradeLevel == second.gradeLevel
+
+    # A new experiment with the same title slug does not rename the existing one
+    single = ExperimentStore([dict(SAMPLE_EXPERIMENTS[0])])
+    assert single.experiments[0].id == first.id
+
+
+@pytest.mark.anyio
+async def test_lookup_routes(server):
+    async with asgi_client(server.app) as client:
+        response = await client.get("/api/experiments/by-id/saeuren-im-haushalt-db5738e1")
+        assert response.json()["title"] == "Säuren im Haushalt"
+        assert (await client.get("/api/experiments/by-id/nope")).status_code == 404
+
+        response = await client.post(
+            "/api/experiments/by-id", json={"ids": ["magnetismus-entdecken-6471058b", "nope", "mechanik-experimente-b585acf4"]}
+        )
+        body = response.json()
+        assert [exp["id"] for exp in body["experiments"]] == ["magnetismus-entdecken-6471058b", "mechanik-experimente-b585acf4"]
+        assert body["missing"] == ["nope"]
+
+        response = await client.get("/api/experiments/Wärme und Temperatur")
+        assert response.json()["id"] == "waerme-und-temperatur-b90cfe78"
+
+
+def test_registry_evicts_least_recently_used_store():
+    registry = StoreRegistry(budget_bytes=250, overhead=1.0)
+    registry.get("a.json", SAMPLE_EXPERIMENTS[:1], digest="a", size=100)
+    registry.get("b.json", SAMPLE_EXPERIMENTS[:1], digest="b", size=100)
+    registry.get("a.json", SAMPLE_EXPERIMENTS[:1], digest="a", size=100)
+    registry.get("c.json", SAMPLE_EXPERIMENTS[:1], digest="c", size=100)
+
+    assert "b.json" not in registry
+    assert "a.json" in registry and "c.json" in registry
+    assert registry.estimated_bytes == 200
+
+
+def test_seeded_stores_count_against_the_budget():
+    evicted = []
+    registry = StoreRegistry(budget_bytes=250, overhead=1.0, on_evict=evicted.append)
+    for key in ("a.json", "b.json", "c.json"):
+        registry.seed(key, ExperimentStore(SAMPLE_EXPERIMENTS[:1], digest=key), size=100)
+
+    assert evicted == ["a.json"]
+    assert "b.json" in registry and "c.json" in registry
+    assert registry.estimated_bytes == 200
+
+
+@pytest.mark.anyio
+async def test_evicted_store_drops_its_encoded_responses(server):
+    server._stores.budget_bytes = 1
+    async with asgi_client(server.app) as client:
+        await client.get("/api/experiments")
+        await client.get("/api/bootstrap")
+        await client.get("/api/subjects")
+        assert "experiments:_experiments.json" in server._responses
+        await client.get("/api/experiments", params={"lang": "en"})
+
+    assert "_experiments.json" not in server._stores
+    assert "experiments:_experiments.json" not in server._responses
+    assert "bootstrap:full:_experiments.json" not in server._responses
+    assert "experiments:_experiments_eng.json" in server._responses
+    assert "subjects" in server._responses
+
+
+@pytest.mark.anyio
+async def test_languages_are_loaded_lazily(server, fake_upstream):
+    async with asgi_client(server.app) as client:
+        german = await client.get("/api/experiments/search", params={"subject": "Physik"})
+        assert len(german.json()) == 3
+        assert fake_upstream.hits["_experiments_eng.json"] == 0
+
+        english = await client.get("/api/experiments/search", params={"subject": "physics", "lang": "en"})
+        assert [exp["title"] for exp in english.json()] == ["Mechanics experiments"]
+        english_id = english.json()[0]["id"]
+        assert (await client.get(f"/api/experiments/by-id/{english_id}", params={"lang": "en"})).status_code == 200
+        assert (await client.get("/api/experiments", params={"lang": "xx"})).status_code == 400
+
+
+def test_registry_reports_changes_between_versions():
+    registry = StoreRegistry(history=2)
+    registry.get("x.json", SAMPLE_EXPERIMENTS[:3], digest="v1" * 8)
+    changed = [dict(SAMPLE_EXPERIMENTS[0], shortDescription="Neu"), SAMPLE_EXPERIMENTS[2], SAMPLE_EXPERIMENTS[3]]
+    store = registry.get("x.json", changed, digest="v2" * 8)
+
+    delta = registry.changes("x.json", store, "v1" * 8)
+    assert titles(store.experiments[i] for i in delta["added"]) == ["Magnetismus entdecken"]
+    assert titles(store.experiments[i] for i in delta["modified"]) == ["Mechanik Experimente"]
+    assert delta["removed"] == ["waerme-und-temperatur-b90cfe78"]
+    assert registry.changes("x.json", store, store.dataset_version) == {"added": [], "modified": [], "removed": []}
+
+    registry.get("x.json", SAMPLE_EXPERIMENTS, digest="v3" * 8)
+    assert registry.changes("x.json", store, "v1" * 8) is None
+    assert registry.changes("x.json", store, "unknown") is None
+
+
+@pytest.mark.anyio
+async def test_changes_endpoint_returns_delta_or_full_dataset(server, fake_upstream):
+    async with asgi_client(server.app) as client:
+        initial = (await client.get("/api/experiments/changes")).json()
+        assert initial["full"] is True
+        assert len(initial["experiments"]) == len(SAMPLE_EXPERIMENTS)
+
+        added = dict(SAMPLE_EXPERIMENTS[0], title="Licht und Schatten")
+        fake_upstream.files["_experiments.json"] = json.dumps(SAMPLE_EXPERIMENTS[1:] + [added])
+        await server._cache.refresh("_experiments.json")
+        await server.store_for_file("_experiments.json", wait=True)
+
+        delta = (await client.get("/api/experiments/changes", params={"since": initial["version"]})).json()
+        assert delta["full"] is False
+        assert delta["version"] != initial["version"]
+        assert [exp["title"] for exp in delta["added"]] == ["Licht und Schatten"]
+        assert delta["modified"] == []
+        assert delta["removed"] == ["mechanik-experimente-b585acf4"]
+
+        stale = (await client.get("/api/experiments/changes", params={"since": "0123456789abcdef"})).json()
+        assert stale["full"] is True
+        assert len(stale["experiments"]) == len(SAMPLE_EXPERIMENTS)
+
+
+def counts(result, field):
+    return {item["value"]: item["count"] for item in result["facets"][field]}
+
+
+def test_facet_counts_without_filters(store):
+    result = store.facet_counts()
+    assert result["total"] == 4
+    assert counts(result, "subject") == {"Chemie": 1, "Physik": 3}
+    assert [item["value"] for item in result["facets"]["gradeLevel"]] == ["5", "7", "8"]
+    assert store.grades == ["5", "7", "8"]
+
+
+def test_conditional_facet_counts_leave_out_their_own_filter(store):
+    result = store.facet_counts(subject="physik", gradeLevel="7")
+    assert result["total"] == 1
+    # Switching the subject while keeping grade 7
+    assert counts(result, "subject") == {"Chemie": 1, "Physik": 1}
+    # Switching the grade while keeping Physik
+    assert counts(result, "gradeLevel") == {"5": 1, "7": 1, "8": 1}
+    assert counts(result, "schoolType") == {"Gesamtschule": 0, "Gymnasium": 1, "Realschule": 0}
+
+
+def test_facet_counts_respect_freetext(store):
+    result = store.facet_counts(freetext="magnet")
+    assert result["total"] == 1
+    assert counts(result, "subject") == {"Chemie": 0, "Physik": 1}
+
+
+@pytest.mark.anyio
+async def test_facets_endpoint(server):
+    async with asgi_client(server.app) as client:
+        unfiltered = await client.get("/api/facets")
+        filtered = await client.get("/api/facets", params={"schoolType": "gymnasium"})
+
+    assert unfiltered.status_code == 200
+    assert "ETag" in unfiltered.headers
+    assert counts(unfiltered.json(), "schoolType") == {"Gesamtschule": 1, "Gymnasium": 2, "Realschule": 1}
+    assert filtered.json()["total"] == 2
+    assert counts(filtered.json(), "subject") == {"Chemie": 1, "Physik": 1}
+
+
+def test_records_intern_facets_and_decode_steps_lazily(store):
+    physik = [record for record in store.experiments if record.subject == "Physik"]
+    assert physik[0].subject is physik[1].subject is sys.intern("Physik")
+    assert json.loads(physik[0].encoded_steps) == physik[0].steps
+    assert "steps" not in physik[0].model_dump({"id", "title", "subject"})
+
+
+def test_records_match_their_models():
+    for data in SAMPLE_EXPERIMENTS:
+        exp = Experiment(**data)
+        record = ExperimentRecord.from_model(exp)
+        assert record.model_dump() == exp.model_dump()
+        assert json.loads(record.encoded) == exp.model_dump()
+        assert pickle.loads(pickle.dumps(record)).model_dump() == exp.model_dump()
@@ -0,0 +1,78 @@
+import pytest
+
+from suggest import NODE_TOP_K, SuggestIndex, max_edits
+from tests.helpers import asgi_client
+
+
+@pytest.fixture
+def index():
+    titles = [
+        ("magnetismus-entdecken", "Magnetismus entdecken"),
+        ("waerme-und-temperatur", "Wärme und Temperatur"),
+        ("magnetische-kraefte", "Magnetische Kräfte messen"),
+    ]
+    texts = [f"{title} Ein Magnet zieht Eisen an" for _, title in titles]
+    return SuggestIndex(titles, {"Physik": 3, "Chemie": 1}, texts)
+
+
+def texts(suggestions):
+    return [suggestion["text"] for suggestion in suggestions]
+
+
+def test_prefix_completes_any_word_best_first(index):
+    # Terms in more experiments first, then titles before rarer terms
+    assert texts(index.suggest("magn")) == [
+        "Magnet", "Magnetische Kräfte messen", "Magnetismus entdecken", "Magnetische", "Magnetismus",
+    ]
+    assert index.suggest("entd")[0] == {
+        "text": "Magnetismus entdecken", "type": "title", "id": "magnetismus-entdecken",
+    }
+    assert index.suggest("ph") == [{"text": "Physik", "type": "subject"}]
+
+
+def test_folding_and_stopwords(index):
+    assert texts(index.suggest("waerm")) == ["Wärme und Temperatur", "Wärme"]
+    assert texts(index.suggest("WÄRME")) == ["Wärme und Temperatur", "Wärme"]
+    assert "zieht" in [text.lower() for text in texts(index.suggest("zie"))]
+    assert index.suggest("ein") == []
+
+
+def test_typos_within_bounded_edits(index):
+    assert max_edits("mag") == 0 and max_edits("magn") == 1 and max_edits("magnetsimus") == 2
+    assert texts(index.suggest("Magnetsimus")) == ["Magnetismus entdecken", "Magnetismus"]
+    assert texts(index.suggest("Temprature")) == ["Wärme und Temperatur", "Temperatur"]
+    # The first letter has to match
+    assert index.suggest("Nagnetismus") == []
+    assert index.suggest("Mxyzetismus") == []
+
+
+def test_earlier_words_must_be_contained(index):
+    assert texts(index.suggest("magnetismus ent")) == ["Magnetismus entdecken"]
+    assert texts(index.suggest("kräfte mes")) == ["Magnetische Kräfte messen"]
+    assert texts(index.suggest("kräfte mesen")) == ["Magnetische Kräfte messen"]
+    assert index.suggest("wärme ent") == []
+    assert index.suggest("") == [] and index.suggest("  !") == []
+
+
+def test_limit_and_node_top_k():
+    titles = [(str(i), f"Versuch {i:03d}") for i in range(NODE_TOP_K * 2)]
+    index = SuggestIndex(titles, {}, [])
+    assert texts(index.suggest("vers", limit=3)) == ["Versuch 000", "Versuch 001", "Versuch 002"]
+    assert len(index.suggest("vers", limit=100)) == NODE_TOP_K
+    assert texts(index.suggest("versuch 03")) == [f"Versuch {i:03d}" for i in range(30, 32)]
+
+
+@pytest.mark.anyio
+async def test_suggest_endpoint(server):
+    async with asgi_client(server.app) as client:
+        response = await client.get("/api/experiments/suggest", params={"q": "Magnetsimus"})
+        english = await client.get("/api/experiments/suggest", params={"q": "Mag", "lang": "en"})
+        invalid = await client.get("/api/experiments/suggest", params={"q": "Mag", "limit": 100})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["query"] == "Magnetsimus"
+    assert body["suggestions"][0] == {"text": "Magnetismus entdecken", "type": "title", "id": "magnetismus-entdecken-6471058b"}
+    assert len(body["version"]) == 16
+    assert english.status_code == 200
+    assert invalid.status_code == 422
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from translation import StubTranslator, TranslationCache, TranslationService
+from tests.helpers import asgi_client
+
+
+class SlowTranslator(StubTranslator):
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.peak = 0
+
+    async def translate(self, text, source, target):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return await super().translate(text, source, target)
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = TranslationService(TranslationCache(tmp_path / "translations.sqlite3"), StubTranslator())
+    yield service
+    service.cache.close()
+
+
+@pytest.mark.anyio
+async def test_duplicates_are_translated_once(service):
+    result = await service.translate(["Wärme", "Licht", "Wärme", ""], target="en")
+
+    assert result["translations"] == ["[en] Wärme", "[en] Licht", "[en] Wärme", ""]
+    assert service.translator.calls == ["Wärme", "Licht"]
+    assert result["translated"] == 2
+
+
+@pytest.mark.anyio
+async def test_cache_persists_across_instances(tmp_path):
+    path = tmp_path / "translations.sqlite3"
+    first = TranslationService(TranslationCache(path), StubTranslator())
+    await first.translate(["Wärme"], target="fr")
+    first.cache.close()
+
+    second = TranslationService(TranslationCache(path), StubTranslator())
+    result = await second.translate(["Wärme", "Licht"], target="fr")
+    assert second.translator.calls == ["Licht"]
+    assert result["cached"] == 1
+    # Other target languages are separate cache entries
+    await second.translate(["Wärme"], target="ru")
+    assert second.translator.calls == ["Licht", "Wärme"]
+    second.cache.close()
+
+
+@pytest.mark.anyio
+async def test_offline_mode_serves_cached_translations_only(tmp_path):
+    path = tmp_path / "translations.sqlite3"
+    online = TranslationService(TranslationCache(path), StubTranslator())
+    await online.translate(["Wärme"], target="en")
+    online.cache.close()
+
+    offline = TranslationService(TranslationCache(path), StubTranslator(), offline=True)
+    result = await offline.translate(["Wärme", "Licht"], target="en")
+    assert result["translations"] == ["[en] Wärme", "Licht"]
+    assert result["failed"] == 1
+    assert offline.translator.calls == []
+    offline.cache.close()
+
+
+@pytest.mark.anyio
+async def test_translator_concurrency_is_bounded(tmp_path):
+    translator = SlowTranslator()
+    service = TranslationService(TranslationCache(tmp_path / "t.sqlite3"), translator, concurrency=3)
+    await asyncio.gather(
+        service.translate([f"Satz {i}" for i in range(10)], target="en"),
+        service.translate([f"Satz {i}" for i in range(5, 15)], target="en"),
+    )
+    assert translator.peak <= 3
+    assert len(translator.calls) == 15
+    service.cache.close()
+
+
+@pytest.mark.anyio
+async def test_translate_endpoint(server, service, monkeypatch):
+    monkeypatch.setattr(server, "_translations", service)
+    async with asgi_client(server.app) as client:
+        response = await client.post("/api/translate", json={"texts": ["Magnet", "Magnet"], "target": "uk"})
+        assert response.json() == {
+            "translations": ["[uk] Magnet", "[uk] Magnet"],
+            "cached": 0,
+            "translated": 1,
+            "failed": 0,
+        }
+        invalid = await client.post("/api/translate", json={"texts": ["x"], "target": "../etc"})
+        assert invalid.status_code == 422
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+from tests.helpers import asgi_client
+
+
+@pytest.mark.anyio
+async def test_concurrent_cold_requests_share_one_upstream_fetch(server, fake_upstream):
+    fake_upstream.delay = 0.2
+
+    async with asgi_client(server.app) as client:
+        responses = await asyncio.gather(
+            *[client.get("/api/experiments") for _ in range(200)]
+        )
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all(len(r.json()) == 4 for r in responses)
+    assert fake_upstream.hits["_experiments.json"] == 1
+
+
+@pytest.mark.anyio
+async def test_other_endpoints_are_served_while_fetch_is_in_flight(server, fake_upstream):
+    fake_upstream.delay = 0.5
+
+    async with asgi_client(server.app) as client:
+        slow = asyncio.ensure_future(client.get("/api/experiments"))
+        await asyncio.sleep(0.05)
+        root = await client.get("/api/")
+        assert root.status_code == 200
+        assert not slow.done()
+        assert (await slow).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_upstream_error_is_reported_and_not_cached(server, fake_upstream):
+    del fake_upstream.files["impressum.txt"]
+
+    async with asgi_client(server.app) as client:
+        response = await client.get("/api/impressum")
+        assert response.status_code == 500
+
+        fake_upstream.files["impressum.txt"] = "Impressum"
+        response = await client.get("/api/impressum")
+        assert response.json() == {"content": "Impressum"}